@@ -11,17 +11,131 @@ class Settings(BaseSettings):
     ibm_service_url: str = ""
     project_id: str = ""
     
+    # watsonx.ai client pool / generation executor
+    watsonx_max_concurrency: int = 8
+    watsonx_token_refresh_interval: float = 45 * 60
+    # Admission control (see app/services/admission.py): at most watsonx_max_concurrency generations
+    # at once, started at up to watsonx_rate_limit per second; interactive before batch.
+    # Limits are for the whole server: each of web_concurrency workers gets an equal share
+    watsonx_rate_limit: float = 8.0  # 0 = concurrency cap only
+    watsonx_burst: int = 8
+    watsonx_queue_size: int = 200  # shed new arrivals beyond this many waiting
+    watsonx_queue_wait: float = 10.0  # interactive calls are shed after waiting this long
+    watsonx_batch_queue_wait: float = 120.0  # batch and background calls
+
+    # Batch analysis
+    batch_max_items: int = 100
+    batch_analysis_concurrency: int = 4
+
+    # Local ingredient rule engine ("" = bundled app/data/ingredient_rules.json)
+    rules_path: str = ""
+
     # Watson Discovery / OCR
     watson_discovery_api_key: str = ""
     watson_discovery_url: str = ""
     discovery_environment_id: str = ""
     discovery_collection_id: str = ""
     
+    # Logging (see app/logging_setup.py); model outputs go to their own rotating file
+    log_format: str = "text"  # text | json (console)
+    log_queue_size: int = 10000
+    model_log_path: str = "logs/model_output.log"  # "" = do not keep model outputs
+    model_log_sample_rate: float = 1.0
+    model_log_max_bytes: int = 50 * 1024 * 1024
+    model_log_rotate_interval: float = 24 * 60 * 60  # 0 = size-based rotation only
+    model_log_backup_count: int = 14
+    model_log_compress: bool = True
+
+    # Resilience: per-request deadline, circuit breakers, hedged OFF reads
+    request_deadline: float = 25.0  # seconds; 0 = no deadline
+    off_stage_budget: float = 5.0  # most of the deadline an OFF lookup may use before analysis starts
+    off_hedge_delay: float = 0.6  # send a second OFF product read if the first is slower (never searches); 0 = no hedging
+    watsonx_timeout: float = 20.0
+    breaker_failure_threshold: int = 5
+    breaker_recovery_timeout: float = 30.0
+
+    # Observability: trace every request (otherwise only requests sent with `X-Trace: 1`)
+    trace_requests: bool = False
+
+    # Open Food Facts HTTP client (shared keep-alive pool)
+    off_base_url: str = "https://world.openfoodfacts.org"
+    off_timeout: float = 10.0
+    off_pool_size: int = 100
+    off_pool_per_host: int = 30
+    off_keepalive_timeout: float = 30.0
+    # Overall budget for the concurrent longest-word fallback searches
+    off_fallback_deadline: float = 8.0
+
+    # Local OFF dump store (see app/services/off_store.py); "" = network only
+    off_store_path: str = ""
+
+    # In-memory fuzzy search over known products
+    search_index_size: int = 50000
+    search_index_min_similarity: float = 0.75
+    # Serve a search locally when at least this many known products match every word
+    search_index_min_hits: int = 3
+
+    # Caching (set cache_db_path to "" for memory-only caches)
+    cache_db_path: str = ".cache/label_padhega.sqlite3"
+    product_cache_size: int = 2000
+    product_cache_ttl: float = 24 * 3600
+    product_not_found_ttl: float = 300
+    # Expired entries are still served this long while a fresh copy is fetched in the background
+    product_cache_stale_ttl: float = 7 * 24 * 3600
+    analysis_cache_size: int = 5000
+    analysis_cache_ttl: float = 7 * 24 * 3600
+    analysis_cache_stale_ttl: float = 30 * 24 * 3600
+    # Sent as X-Admin-Token to invalidate or clear cached analyses; "" = those endpoints are disabled
+    admin_token: str = ""
+    # Memoized per-ingredient assessments for incremental analysis
+    ingredient_memo_size: int = 20000
+    ingredient_memo_ttl: float = 90 * 24 * 3600
+
+    # Background refresher (see app/services/refresher.py): pre-warms the most requested
+    # barcodes at startup and every refresh_interval, and revalidates stale reads
+    refresh_top_n: int = 100  # 0 = no scheduled pre-warming
+    refresh_interval: float = 15 * 60
+    refresh_rate_limit: float = 0.5  # background refetches per second, OFF and watsonx together, all workers
+    refresh_concurrency: int = 2
+    refresh_popularity_half_life: float = 24 * 3600
+
+    # OCR job pipeline
+    ocr_backend: str = "mock"  # mock | discovery | tesseract
+    ocr_workers: int = 2
+    ocr_queue_size: int = 100
+    ocr_job_ttl: float = 3600
+    ocr_discovery_timeout: float = 60
+    ocr_discovery_poll_interval: float = 1.0
+    ocr_max_upload_bytes: int = 10 * 1024 * 1024
+    # Uploads are downscaled so the longest side is at most this many pixels
+    ocr_max_dimension: int = 1600
+    # Max Hamming distance between 64-bit perceptual hashes to shortlist a previous photo
+    ocr_phash_distance: int = 6
+    # A shortlisted photo counts as the same label only if the 1024-bit text-region hashes are this
+    # close (same label rescaled/recompressed: ~30 bits; different text in the same layout: ~200)
+    ocr_phash_confirm_distance: int = 48
+    ocr_phash_cache_size: int = 5000
+    # How long the synchronous /ocr endpoint waits for its job before answering 202
+    ocr_sync_wait: float = 30
+
+    # Responses smaller than this are sent uncompressed (0 = compress everything)
+    response_compression_min_size: int = 1000
+
     # Server default
     host: str = "0.0.0.0"
     port: int = 8000
     log_level: str = "info"
 
+    # Pre-import SDKs and build clients in the background at startup (see /ready)
+    warmup_on_start: bool = True
+
+    # Production server (gunicorn.conf.py): pre-forked workers, recycled after max_requests
+    web_concurrency: int = 0  # 0 = one worker per usable CPU, at most 4
+    graceful_timeout: int = 30
+    worker_timeout: int = 120
+    max_requests: int = 5000
+    max_requests_jitter: int = 500
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -0,0 +1,205 @@
+"""
+Process-wide logging: callers only enqueue records; one background thread
+formats them and does all file and console I/O, so a slow or stalled disk
+never adds latency to a request.
+"""
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from app.config import get_settings
+from app.services import tracing
+
+settings = get_settings()
+
+# Full LLM outputs go to this logger (sampled, own file); everything else to the console
+MODEL_OUTPUT_LOGGER = "app.model_output"
+
+# LogRecord attributes that are not `extra=` fields
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request id and any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id. Runs in the caller's thread, before queueing."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = tracing.request_id()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep roughly `rate` of INFO-and-below records; warnings and errors always pass."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Never blocks the caller: when the queue is full the record is dropped and counted."""
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message now (args may change later) but keep the traceback separate for JsonFormatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates when the file passes `maxBytes` or is older than `interval` seconds,
+    whichever comes first. Rotated files are gzip-compressed when `compress` is set.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float, compress: bool):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = _gzip_rotator
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+                return True
+            # Nothing written this interval: nothing to rotate
+            self.rollover_at = time.time() + self.interval
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        try:
+            super().doRollover()
+        finally:
+            # Even if rotating failed, keep logging to the current file and try again next interval,
+            # rather than retrying (and failing) on every record
+            if self.interval:
+                self.rollover_at = time.time() + self.interval
+            if self.stream is None:
+                self.stream = self._open()
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    if not os.path.exists(source):
+        return
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def stats() -> dict:
+    return {
+        "queued": _listener.queue.qsize() if _listener else 0,
+        "dropped": DroppingQueueHandler.dropped,
+    }
+
+
+def configure() -> None:
+    """
+    Install the queue handler on the root logger and start the writer thread.
+    Idempotent; call once at startup before anything logs.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler(sys.stderr)
+    if settings.log_format == "json":
+        console.setFormatter(JsonFormatter())
+    else:
+        console.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+
+    handlers = [console]
+    model_output = logging.getLogger(MODEL_OUTPUT_LOGGER)
+    if settings.model_log_path:
+        model_file = SizeAndTimeRotatingFileHandler(
+            # "{pid}" gives each process its own file; gunicorn.conf.py fills in "{worker}" per worker slot instead
+            settings.model_log_path.replace("{pid}", str(os.getpid())),
+            max_bytes=settings.model_log_max_bytes,
+            backup_count=settings.model_log_backup_count,
+            interval=settings.model_log_rotate_interval,
+            compress=settings.model_log_compress,
+        )
+        model_file.setFormatter(JsonFormatter())
+        # Route model output to its file only
+        model_file.addFilter(lambda record: record.name == MODEL_OUTPUT_LOGGER)
+        handlers.append(model_file)
+    else:
+        # Not kept anywhere: don't even queue the records
+        model_output.disabled = True
+    # Full model outputs never go to the console, whether or not they are kept
+    console.addFilter(lambda record: record.name != MODEL_OUTPUT_LOGGER)
+    if settings.model_log_sample_rate < 1.0:
+        model_output.addFilter(SamplingFilter(settings.model_log_sample_rate))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.log_level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -1,14 +1,64 @@
-from fastapi import FastAPI
+import time
+
+# Everything below, including the whole app import graph, counts toward cold start (see /ready)
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
+from app import logging_setup
+
+# Before the services are imported, so nothing logs through the default handlers
+logging_setup.configure()
+
+from app.middleware import CompressionMiddleware, DeadlineMiddleware, MetricsMiddleware, RequestIdMiddleware, UploadSizeLimitMiddleware
 from app.routes import products, analysis
+from app.services import openfoodfacts_service, watson_ai_service, watson_ocr_service, ocr_jobs
+from app.services.cache import all_stats
+from app.services import singleflight, metrics, resilience, rule_engine, warmup, refresher
 
 settings = get_settings()
 
+IMPORT_MS = round((time.perf_counter() - _import_started) * 1000, 1)
+_startup_ms: float = 0.0
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _startup_ms
+    # Shared upstream clients live for the whole process
+    await openfoodfacts_service.startup()
+    await ocr_jobs.start()
+    # Pre-warm popular products and analyses now and on a schedule
+    await refresher.start()
+    # SDK imports, client construction and rule compilation happen in the background,
+    # so the first request is accepted right away; /ready reports when they are done
+    if settings.warmup_on_start:
+        warmup.start({
+            "watsonx": watson_ai_service.warmup if watson_ai_service.is_configured() else None,
+            "discovery": watson_ocr_service.warmup if settings.ocr_backend == "discovery" else None,
+            "rules": rule_engine.get_engine,
+        })
+    _startup_ms = round((time.perf_counter() - _import_started) * 1000, 1)
+    try:
+        yield
+    finally:
+        await refresher.stop()
+        await ocr_jobs.stop()
+        await openfoodfacts_service.shutdown()
+        watson_ai_service.shutdown()
+        logging_setup.shutdown()
+
+
 app = FastAPI(
     title=settings.app_name,
     description="Backend for Label Padhega India - Food Transparency App",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson encodes responses several times faster than the stdlib json module
+    default_response_class=ORJSONResponse,
 )
 
 # CORS
@@ -20,10 +70,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Cut oversized image uploads off while they stream in
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.ocr_max_upload_bytes,
+    path_prefixes=(f"{settings.api_v1_str}/ocr",),
+)
+
+# Time budget for interactive requests; streams, batches and OCR run longer by design
+app.add_middleware(
+    DeadlineMiddleware,
+    seconds=settings.request_deadline,
+    exclude_prefixes=(f"{settings.api_v1_str}/analyze/batch", f"{settings.api_v1_str}/ocr"),
+    exclude_suffixes=("/stream",),
+)
+
+# Brotli/gzip bodies; SSE and NDJSON streams are left uncompressed so each event/line arrives as it is produced
+app.add_middleware(CompressionMiddleware, minimum_size=settings.response_compression_min_size)
+
+# Outermost, so rejected and failed requests are measured too
+app.add_middleware(MetricsMiddleware, routes=app.routes, trace_all=settings.trace_requests)
+app.add_middleware(RequestIdMiddleware)
+
 # Routes
 app.include_router(products.router, prefix="/api/v1", tags=["Products"])
 app.include_router(analysis.router, prefix="/api/v1", tags=["Analysis"])
 
+@app.exception_handler(resilience.CircuitOpen)
+async def circuit_open_handler(request: Request, exc: resilience.CircuitOpen):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"{exc.name} is temporarily unavailable, please retry shortly"},
+        headers={"Retry-After": str(max(1, round(exc.retry_after)))},
+    )
+
 @app.get("/")
 async def root():
     return {
@@ -32,6 +112,52 @@ async def root():
         "status": "running"
     }
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until background warmup (SDK imports, clients, rules) has
+    finished. Also reports import and startup time so cold-start regressions show up.
+    """
+    is_ready = warmup.is_ready()
+    return JSONResponse(
+        status_code=200 if is_ready else 503,
+        content={
+            "ready": is_ready,
+            "import_ms": IMPORT_MS,
+            "startup_ms": _startup_ms,
+            "components": warmup.status(),
+        },
+    )
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return all_stats()
+
+@app.get("/ocr/stats")
+async def ocr_stats():
+    return ocr_jobs.stats()
+
+@app.get("/coalescing/stats")
+async def coalescing_stats():
+    return singleflight.all_stats()
+
+@app.get("/resilience/stats")
+async def resilience_stats():
+    return resilience.all_stats()
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return watson_ai_service.admission_control.stats()
+
+@app.get("/refresher/stats")
+async def refresher_stats():
+    return refresher.stats()
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host=settings.host, port=settings.port, reload=True)
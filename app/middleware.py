@@ -0,0 +1,310 @@
+import json
+import logging
+import re
+import time
+import uuid
+import zlib
+from typing import Optional, Sequence, Tuple
+from starlette.routing import BaseRoute, Match
+from app.services import metrics, resilience, tracing
+
+# Optional: without it responses are gzip-compressed only
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject request bodies over `max_bytes` on the given path prefixes.
+
+    Checks Content-Length up front and also counts bytes as they stream in, so a
+    chunked upload is cut off as soon as it crosses the limit instead of being
+    spooled in full first.
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefixes: Tuple[str, ...]):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefixes = path_prefixes
+
+    async def _reject(self, send) -> None:
+        body = json.dumps({"detail": f"Upload exceeds {self.max_bytes} bytes"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not scope["path"].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await self._reject(send)
+                return
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # The framework may turn our exception into its own error response; replace it with a 413
+            if exceeded:
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    await self._reject(send)
+                return
+            started = started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            if not started:
+                await self._reject(send)
+
+
+class RequestIdMiddleware:
+    """
+    Give every request an id: the client's `X-Request-ID` if it is sane, else a
+    new one. It is echoed back in the response and stamped on every log record.
+    """
+
+    _VALID = re.compile(rb"^[A-Za-z0-9._-]{1,64}$")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == b"x-request-id" and self._VALID.match(value):
+                request_id = value.decode()
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def tagged_send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        token = tracing.set_request_id(request_id)
+        try:
+            await self.app(scope, receive, tagged_send)
+        finally:
+            tracing.reset_request_id(token)
+
+
+class DeadlineMiddleware:
+    """
+    Give each request a time budget (see `resilience.deadline`) that upstream
+    calls and analysis stages shrink their timeouts to. Long-running endpoints
+    (streams, batches, OCR) are excluded by path.
+    """
+
+    def __init__(self, app, seconds: float, exclude_prefixes: Tuple[str, ...] = (), exclude_suffixes: Tuple[str, ...] = ()):
+        self.app = app
+        self.seconds = seconds
+        self.exclude_prefixes = exclude_prefixes
+        self.exclude_suffixes = exclude_suffixes
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if (
+            scope["type"] != "http"
+            or self.seconds <= 0
+            or path.startswith(self.exclude_prefixes)
+            or path.endswith(self.exclude_suffixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+        with resilience.deadline(self.seconds):
+            await self.app(scope, receive, send)
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip response bodies, whichever the client accepts (brotli only when
+    the `brotli` package is installed). Streaming media types (SSE, NDJSON) pass
+    through untouched so every event or line reaches the client as it is produced;
+    other streamed bodies are flushed chunk by chunk. Single-chunk bodies under
+    `minimum_size` bytes are not worth compressing.
+    """
+
+    STREAMING_MEDIA_TYPES = ("text/event-stream", "application/x-ndjson")
+
+    def __init__(self, app, minimum_size: int, exclude_media_types: Tuple[str, ...] = STREAMING_MEDIA_TYPES):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_media_types = exclude_media_types
+
+    @staticmethod
+    def _encoding(scope) -> Optional[str]:
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accepted = {token.split(b";")[0].strip() for token in value.lower().split(b",")}
+                if brotli is not None and b"br" in accepted:
+                    return "br"
+                if b"gzip" in accepted:
+                    return "gzip"
+        return None
+
+    def _compressible(self, headers, body: bytes, more_body: bool) -> bool:
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type" and value.split(b";")[0].strip().decode("latin-1") in self.exclude_media_types:
+                return False
+        return more_body or len(body) >= self.minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = self._encoding(scope) if scope["type"] == "http" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                # Headers depend on the first body chunk; hold them until it arrives
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = list(start.get("headers", []))
+                if not self._compressible(headers, body, more_body):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                headers = [(n, v) for n, v in headers if n != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"vary", b"Accept-Encoding")]
+                await send({**start, "headers": headers})
+
+            # Flush after every chunk of a streamed body, so it is not held back until the end
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor()
+        else:
+            # wbits=31: zlib stream with a gzip header and trailer
+            self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress `data` and flush, so the client can decode it without waiting for more."""
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class MetricsMiddleware:
+    """
+    Per-route latency, in-flight and error metrics, labelled by route template
+    (`/api/v1/product/{code}`) rather than raw path to keep label cardinality bounded.
+
+    Requests are traced when `trace_all` is set or the client sends `X-Trace: 1`:
+    spans recorded during the request are returned in a `Server-Timing` header
+    and logged when the response finishes.
+    """
+
+    def __init__(self, app, routes: Sequence[BaseRoute], trace_all: bool = False):
+        self.app = app
+        self.routes = routes
+        self.trace_all = trace_all
+
+    def _route_template(self, scope) -> str:
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return getattr(route, "path", "unmatched")
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        traced = self.trace_all or (b"x-trace", b"1") in scope.get("headers", [])
+        token = tracing.start(f"{method} {route}") if traced else None
+        trace = tracing.current()
+        status = 500
+
+        async def instrumented_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace is not None:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", trace.server_timing().encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        in_flight = metrics.REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, instrumented_send)
+        except BaseException:
+            status = 500
+            raise
+        finally:
+            in_flight.dec()
+            metrics.REQUEST_LATENCY.labels(method, route, str(status)).observe(time.perf_counter() - started)
+            if status >= 500:
+                metrics.REQUEST_ERRORS.labels(method, route, str(status)).inc()
+            if token is not None:
+                logger.info(f"trace {json.dumps(trace.to_dict())}")
+                tracing.finish(token)
@@ -20,6 +20,33 @@ class AnalyzeResponse(BaseModel):
     product_name: Optional[str] = None
     analysis: str
 
+class BatchAnalyzeRequest(BaseModel):
+    codes: List[str] = Field(default_factory=list)
+    items: List[AnalyzeRequest] = Field(default_factory=list)
+    # Optional per-request cap; never above the server's batch_analysis_concurrency
+    concurrency: Optional[int] = None
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    code: Optional[str] = None
+    product_name: Optional[str] = None
+    status: str = "ok"  # "ok" | "error"
+    analysis: Optional[str] = None
+    error: Optional[str] = None
+
+class OCRJob(BaseModel):
+    id: str
+    status: str = "queued"  # "queued" | "processing" | "done" | "failed"
+    created_at: float
+    finished_at: Optional[float] = None
+    product_name: Optional[str] = None
+    extracted_text: Optional[str] = None
+    analysis: Optional[str] = None
+    error: Optional[str] = None
+    # True when a near-identical image was analysed before and its result was reused
+    deduplicated: bool = False
+
 class OCRRequest(BaseModel):
     # Depending on how we handle the image (multipart usually), but for metadata:
     pass # Image will be uploaded as File
@@ -1,64 +1,254 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from app.models.analysis_models import AnalyzeRequest, AnalyzeResponse, AnalysisResult
-from app.services import watson_ai_service, watson_ocr_service
-from app.services import openfoodfacts_service
+import json
+import secrets
+from typing import AsyncIterator
+from fastapi import APIRouter, Depends, File, Header, UploadFile, HTTPException, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.config import get_settings
+from app.models.analysis_models import AnalyzeRequest, AnalyzeResponse, AnalysisResult, BatchAnalyzeRequest, OCRJob
+from app.services import watson_ai_service, ocr_jobs
+from app.services import openfoodfacts_service, batch_service, rule_engine, resilience, refresher
 
 router = APIRouter()
+settings = get_settings()
+
+# full: LLM only. fast: local rule engine only, no LLM call.
+# assisted: rule engine findings + a shorter LLM prompt.
+# incremental: memoized per-ingredient assessments; only new ingredients and a short compose step hit the LLM.
+ANALYSIS_MODE = Query(
+    "full", pattern="^(full|fast|assisted|incremental)$", description="full | fast | assisted | incremental"
+)
+
+def _require_admin(x_admin_token: str = Header("")):
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not secrets.compare_digest(x_admin_token.encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+async def _fetch_for_analysis(code: str):
+    refresher.record(code)
+    # Cap the OFF lookup so most of the request's deadline is left for the analysis itself
+    with resilience.deadline(settings.off_stage_budget):
+        product = await openfoodfacts_service.get_product_details(code)
+    if not product or not product.ingredients_text:
+        raise HTTPException(status_code=404, detail="Product ingredients not found")
+    return product
+
+async def _analyze(ingredients: str, product_name: str, mode: str) -> str:
+    if mode == "fast":
+        return rule_engine.render_text(rule_engine.detect(ingredients, product_name))
+    if mode == "incremental":
+        return await watson_ai_service.analyze_incremental_async(ingredients, product_name)
+    findings = rule_engine.detect(ingredients, product_name) if mode == "assisted" else None
+    return await watson_ai_service.analyze_ingredients_async(ingredients, product_name, findings)
 
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_ingredients(request: AnalyzeRequest):
+async def analyze_ingredients(request: AnalyzeRequest, mode: str = ANALYSIS_MODE):
     """
     Analyze ingredient list for harmful contents using IBM Watson AI.
     """
-    analysis = watson_ai_service.analyze_ingredients_with_watson(request.ingredients_text, request.product_name)
+    analysis = await _analyze(request.ingredients_text, request.product_name, mode)
     return AnalyzeResponse(product_name=request.product_name, analysis=analysis)
 
+@router.post("/analyze/rules", response_model=AnalysisResult)
+async def analyze_with_rules(request: AnalyzeRequest):
+    """
+    Structured result from the local rule engine only (additives, hidden sugars, Maida trap, marketing traps).
+    """
+    return rule_engine.detect(request.ingredients_text, request.product_name)
+
+@router.post("/analyze/rules/reload", dependencies=[Depends(_require_admin)])
+async def reload_rules():
+    """
+    Re-read the ingredient rules file without restarting. Requires the `X-Admin-Token` header.
+    """
+    engine = rule_engine.reload()
+    return {"source": engine.source, "additives": len(engine.additives)}
+
 @router.post("/analyze/product/{code}", response_model=AnalyzeResponse)
-async def analyze_product_by_id(code: str):
+async def analyze_product_by_id(code: str, mode: str = ANALYSIS_MODE):
     """
     Fetch product from Open Food Facts and then analyze it.
     Returns the analysis as a plain text string.
     """
-    product = openfoodfacts_service.get_product_details(code)
-    
-    if not product or not product.ingredients_text:
-        raise HTTPException(status_code=404, detail="Product ingredients not found")
+    product = await _fetch_for_analysis(code)
     
     # Get the plain text analysis string
-    analysis_text = watson_ai_service.analyze_ingredients_with_watson(
-        product.ingredients_text, 
-        product.product_name
-    )
+    analysis_text = await _analyze(product.ingredients_text, product.product_name, mode)
     
     # Return directly. 
     return AnalyzeResponse(product_name=product.product_name, analysis=analysis_text)
 
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+async def _sse_analysis(ingredients: str, product_name: str) -> AsyncIterator[str]:
+    try:
+        async for text in watson_ai_service.stream_analysis(ingredients, product_name):
+            yield _sse("chunk", {"text": text})
+    except Exception:
+        yield _sse("error", {"detail": "A system error occurred during the ingredient analysis. Please try again later."})
+        return
+    yield _sse("done", {"product_name": product_name})
+
+def _stream_response(ingredients: str, product_name: str) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_analysis(ingredients, product_name),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analyze/stream")
+async def analyze_ingredients_stream(request: AnalyzeRequest):
+    """
+    Streaming variant of /analyze. Sends Server-Sent Events:
+    `chunk` events carry `{"text": ...}` as it is generated, then a final `done` (or `error`).
+    """
+    return _stream_response(request.ingredients_text, request.product_name)
+
+@router.post("/analyze/product/{code}/stream")
+async def analyze_product_by_id_stream(code: str):
+    """
+    Streaming variant of /analyze/product/{code}. Same event format as /analyze/stream.
+    """
+    product = await _fetch_for_analysis(code)
+
+    return _stream_response(product.ingredients_text, product.product_name)
+
+@router.post("/analyze/structured", response_model=AnalysisResult)
+async def analyze_structured(request: AnalyzeRequest):
+    """
+    LLM analysis as a structured `AnalysisResult` (verdict, risks, traps, alerts, warnings)
+    instead of free text, so clients do not have to parse it.
+    """
+    try:
+        return await watson_ai_service.analyze_structured_async(request.ingredients_text, request.product_name or "")
+    except Exception:
+        raise HTTPException(status_code=502, detail="The model did not return a usable structured analysis.")
+
+@router.post("/analyze/product/{code}/structured", response_model=AnalysisResult)
+async def analyze_product_structured(code: str):
+    """
+    Structured variant of /analyze/product/{code}.
+    """
+    product = await _fetch_for_analysis(code)
+
+    try:
+        return await watson_ai_service.analyze_structured_async(product.ingredients_text, product.product_name)
+    except Exception:
+        raise HTTPException(status_code=502, detail="The model did not return a usable structured analysis.")
+
+async def _sse_structured(ingredients: str, product_name: str) -> AsyncIterator[str]:
+    try:
+        async for name, value in watson_ai_service.stream_structured_analysis(ingredients, product_name):
+            if name == "result":
+                yield f"event: done\ndata: {value.model_dump_json()}\n\n"
+            else:
+                yield _sse("field", {"name": name, "value": value})
+    except Exception:
+        yield _sse("error", {"detail": "The model did not return a usable structured analysis."})
+
+@router.post("/analyze/structured/stream")
+async def analyze_structured_stream(request: AnalyzeRequest):
+    """
+    Streaming variant of /analyze/structured. Sends Server-Sent Events:
+    a `field` event `{"name": ..., "value": ...}` as each field is generated and validated,
+    then `done` with the complete `AnalysisResult` (or `error`).
+    """
+    return StreamingResponse(
+        _sse_structured(request.ingredients_text, request.product_name or ""),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analyze/batch")
+async def analyze_batch(request: BatchAnalyzeRequest):
+    """
+    Analyze many barcodes and/or ingredient lists in one call.
+    Streams newline-delimited JSON, one `BatchItemResult` per input, in completion order.
+    """
+    total = len(request.codes) + len(request.items)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Provide at least one code or item")
+    if total > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"Batch limited to {settings.batch_max_items} inputs")
+
+    concurrency = settings.batch_analysis_concurrency
+    if request.concurrency:
+        concurrency = max(1, min(request.concurrency, concurrency))
+
+    async def ndjson() -> AsyncIterator[str]:
+        async for result in batch_service.run_batch(request.codes, request.items, concurrency):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/analyze/cache/invalidate", dependencies=[Depends(_require_admin)])
+async def invalidate_cached_analysis(request: AnalyzeRequest):
+    """
+    Forget the cached analysis for this ingredient list so the next request regenerates it.
+    Requires the `X-Admin-Token` header.
+    """
+    watson_ai_service.invalidate_analysis(request.ingredients_text, request.product_name)
+    return {"invalidated": True}
+
+@router.delete("/analyze/cache", dependencies=[Depends(_require_admin)])
+async def clear_cached_analyses():
+    """
+    Drop every cached analysis. Requires the `X-Admin-Token` header.
+    """
+    watson_ai_service.clear_analysis_cache()
+    return {"cleared": True}
+
+async def _submit_upload(file: UploadFile) -> OCRJob:
+    if not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
+
+    # Read file content safely, in chunks, never past the upload limit
+    contents = bytearray()
+    while chunk := await file.read(64 * 1024):
+        contents += chunk
+        if len(contents) > settings.ocr_max_upload_bytes:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {settings.ocr_max_upload_bytes} bytes")
+
+    try:
+        return ocr_jobs.submit(bytes(contents), file.filename)
+    except ocr_jobs.QueueFull:
+        raise HTTPException(status_code=503, detail="OCR queue is full, please retry shortly")
+
+@router.post("/ocr/jobs", response_model=OCRJob, status_code=202)
+async def submit_ocr_job(file: UploadFile = File(...)):
+    """
+    Queue an image of ingredients for OCR and analysis. Returns the job straight away;
+    poll GET /ocr/jobs/{job_id} for the extracted text and analysis.
+    """
+    return await _submit_upload(file)
+
+@router.get("/ocr/jobs/{job_id}", response_model=OCRJob)
+async def get_ocr_job(job_id: str, wait: float = Query(0, ge=0, le=30, description="Seconds to long-poll for completion")):
+    """
+    Status and result of an OCR job.
+    """
+    job = await ocr_jobs.wait(job_id, wait) if wait else ocr_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
 @router.post("/ocr", response_model=AnalyzeResponse)
 async def ocr_and_analyze(file: UploadFile = File(...)):
     """
-    Upload an image of ingredients, extract text via Watson Discovery (or fallback), 
+    Upload an image of ingredients, extract text via the configured OCR backend,
     and then analyze the extracted text.
+
+    Runs through the same job queue as /ocr/jobs and waits for the result without
+    tying up a thread. If the job takes longer than `ocr_sync_wait` the job is
+    returned with 202 so the client can keep polling.
     """
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
-    
-    # Read file content safely
-    contents = await file.read()
-    
-    # Save temporarily if needed by SDK or pass bytes. 
-    # The helper `extract_text_from_image` expects a file-like object or bytes depending on implementation.
-    # Watson Discovery `add_document` takes `file`.
-    
-    # For now, using a mock result in the service if keys aren't there, 
-    # but let's pretend we extracted text.
-    extracted_text = watson_ocr_service.mock_ocr_process() 
-    # extracted_text = watson_ocr_service.extract_text_from_image(contents, file.filename)
-    
-    if "Error" in extracted_text:
-         # If it's a real error (not just the mock message), handle it.
-         pass
+    job = await _submit_upload(file)
+    job = await ocr_jobs.wait(job.id, settings.ocr_sync_wait)
 
-    # Then analyze
-    analysis = watson_ai_service.analyze_ingredients_with_watson(extracted_text, product_name="Uploaded Image Product")
-    
-    return AnalyzeResponse(product_name="Uploaded Image Product", analysis=analysis)
+    if job.status == "done":
+        return AnalyzeResponse(product_name=job.product_name, analysis=job.analysis)
+    if job.status == "failed":
+        raise HTTPException(status_code=502, detail=job.error)
+    return JSONResponse(status_code=202, content=job.model_dump())
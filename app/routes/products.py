@@ -1,31 +1,66 @@
+from typing import Any, Dict, Optional
 from fastapi import APIRouter, HTTPException, Query
-from app.services import openfoodfacts_service
+from fastapi.responses import ORJSONResponse
+from app.services import openfoodfacts_service, refresher
 from app.models.product_models import ProductSearchResponse, ProductDetail, ProductResponse
 
 router = APIRouter()
 
+_FIELDS_DESCRIPTION = "Comma-separated fields to return, e.g. `product_name,nutriments.sugars_100g`"
+
+
+def _select(data: Dict[str, Any], fields: str) -> Dict[str, Any]:
+    """
+    Project `data` onto a `fields=` selector. A dotted name picks one key of a
+    nested dict (`nutriments.sugars_100g`); unknown fields are left out.
+    """
+    selected: Dict[str, Any] = {}
+    for name in filter(None, (f.strip() for f in fields.split(","))):
+        top, _, sub = name.partition(".")
+        if top not in data:
+            continue
+        if not sub:
+            selected[top] = data[top]
+        elif isinstance(data[top], dict) and sub in data[top]:
+            nested = selected.setdefault(top, {})
+            # Already selected whole; never write into the (cached) source dict
+            if nested is not data[top]:
+                nested[sub] = data[top][sub]
+    return selected
+
+
 @router.get("/search", response_model=ProductSearchResponse)
-async def search_products(q: str = Query(..., description="Product name or barcode"), limit: int = 10):
+async def search_products(
+    q: str = Query(..., description="Product name or barcode"),
+    limit: int = 10,
+    stop_early: bool = Query(False, description="Return as soon as `limit` unique fallback results are found")
+):
     """
     Search for products using Open Food Facts API.
     """
-    products = openfoodfacts_service.search_products(q, limit)
+    products = await openfoodfacts_service.search_products(q, limit, stop_early=stop_early)
     return ProductSearchResponse(products=products, count=len(products))
 
 @router.get("/product/{code}", response_model=ProductDetail)
-async def get_product_detail(code: str):
+async def get_product_detail(code: str, fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION)):
     """
     Get generic details for a specific product.
     """
-    product = openfoodfacts_service.get_product_details(code)
+    refresher.record(code)
+    product = await openfoodfacts_service.get_product_details(code)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    if fields:
+        return ORJSONResponse(_select(product.model_dump(), fields))
     return product
 
 @router.get("/barcode/{code}", response_model=ProductResponse)
-async def barcode_search(code: str):
-    product = openfoodfacts_service.barcode_search(code)
+async def barcode_search(code: str, fields: Optional[str] = Query(None, description=_FIELDS_DESCRIPTION)):
+    refresher.record(code)
+    product = await openfoodfacts_service.barcode_search(code)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    if fields:
+        return ORJSONResponse(_select(product, fields))
     return product
     
\ No newline at end of file
@@ -0,0 +1,173 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from app.services import metrics
+
+# Lower is served first
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("admission_priority", default=INTERACTIVE)
+
+
+class Shed(Exception):
+    """Raised when a queued call waited past its deadline or the queue was full."""
+
+    def __init__(self, name: str, priority: int, waited: float):
+        super().__init__(f"{name}: {PRIORITY_NAMES[priority]} request shed after {waited:.1f}s in queue")
+        self.name = name
+        self.priority = priority
+        self.waited = waited
+
+
+@contextmanager
+def priority(level: int):
+    """Run everything inside the block (and tasks it starts) at `level`."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class AdmissionController:
+    """
+    Gate in front of a rate-limited upstream. A call is admitted when fewer
+    than `max_concurrency` are running and the token bucket (`rate` per
+    second, up to `burst`) has a token; otherwise it queues by priority, FIFO
+    within a priority. A queued call is shed (`Shed`) once it has waited
+    `max_wait` seconds, or straight away when `max_queue` calls are already
+    waiting. Event-loop only: acquire and release on the loop thread.
+
+    The limits are for the whole deployment: with `processes` server workers,
+    each one admits its share (`max_concurrency // processes`, at least one,
+    and `rate / processes`), so together they stay within what was configured.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rate: float, burst: int, max_queue: int, processes: int = 1):
+        processes = max(1, processes)
+        self.name = name
+        self.processes = processes
+        self.max_concurrency = max(1, max_concurrency // processes)
+        self.rate = rate / processes
+        self.burst = max(1, burst // processes)
+        self.max_queue = max_queue
+        self.active = 0
+        self.admitted = 0
+        self.shed = 0
+        # (priority, arrival, future); cancelled futures are dropped lazily by `_dispatch`
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued: Dict[int, int] = {level: 0 for level in PRIORITY_NAMES}
+        self._arrivals = itertools.count()
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _can_start(self) -> bool:
+        return self.active < self.max_concurrency and (self.rate <= 0 or self._tokens >= 1)
+
+    def _start(self) -> None:
+        self.active += 1
+        self.admitted += 1
+        if self.rate > 0:
+            self._tokens -= 1
+
+    def _dispatch(self) -> None:
+        """Admit queued calls, highest priority first, while slots and tokens allow."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._refill()
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= self.max_concurrency:
+                return
+            if not self._can_start():
+                # Out of tokens: look again when the next one is due
+                self._timer = asyncio.get_running_loop().call_later((1 - self._tokens) / self.rate, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self._start()
+            future.set_result(None)
+
+    async def acquire(self, level: Optional[int] = None, max_wait: Optional[float] = None) -> None:
+        level = current_priority() if level is None else level
+        label = PRIORITY_NAMES[level]
+        self._refill()
+        if not any(self._queued.values()) and self._can_start():
+            self._start()
+            metrics.ADMISSION_WAIT.labels(self.name, label, "admitted").observe(0)
+            return
+        if sum(self._queued.values()) >= self.max_queue:
+            self._shed(level, 0.0)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._arrivals), future))
+        self._queued[level] += 1
+        depth = metrics.ADMISSION_QUEUE_DEPTH.labels(self.name, label)
+        depth.inc()
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            await asyncio.wait({future}, timeout=max_wait)
+        except asyncio.CancelledError:
+            # Caller went away; give back a slot that was granted meanwhile
+            if future.done():
+                self.release()
+            future.cancel()
+            raise
+        finally:
+            self._queued[level] -= 1
+            depth.dec()
+
+        waited = time.monotonic() - started
+        if not future.done():
+            future.cancel()
+            self._shed(level, waited)
+        metrics.ADMISSION_WAIT.labels(self.name, label, "admitted").observe(waited)
+
+    def _shed(self, level: int, waited: float) -> None:
+        self.shed += 1
+        metrics.ADMISSION_WAIT.labels(self.name, PRIORITY_NAMES[level], "shed").observe(waited)
+        raise Shed(self.name, level, waited)
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, level: Optional[int] = None, max_wait: Optional[float] = None):
+        await self.acquire(level, max_wait)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "processes": self.processes,
+            "queued": {PRIORITY_NAMES[level]: count for level, count in self._queued.items()},
+            "tokens": round(self._tokens, 2) if self.rate > 0 else None,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
@@ -0,0 +1,90 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Tuple
+from app.config import get_settings
+from app.models.analysis_models import AnalyzeRequest, BatchItemResult
+from app.services import admission, openfoodfacts_service, resilience, watson_ai_service
+
+settings = get_settings()
+
+
+async def run_batch(
+    codes: List[str],
+    items: List[AnalyzeRequest],
+    concurrency: int,
+) -> AsyncIterator[BatchItemResult]:
+    """
+    Analyze many barcodes and/or raw ingredient lists, yielding one result per
+    input as soon as it is ready (completion order, not input order).
+
+    Identical inputs are processed once: barcodes are deduped by code, and any
+    two inputs that normalise to the same ingredient list share one analysis.
+    Product fetches all run concurrently; analyses are capped at `concurrency`.
+    Failures are reported on the affected items only.
+
+    Indices number `codes` first, then `items`.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    analyses: Dict[str, asyncio.Task] = {}
+
+    async def limited_analysis(ingredients: str, product_name: str) -> str:
+        async with semaphore:
+            # Queued behind interactive scans for a watsonx slot
+            with admission.priority(admission.BATCH):
+                return await watson_ai_service.analyze_ingredients_async(ingredients, product_name)
+
+    def shared_analysis(ingredients: str, product_name: str) -> asyncio.Task:
+        key = watson_ai_service.analysis_key(ingredients, product_name)
+        if key not in analyses:
+            analyses[key] = asyncio.ensure_future(limited_analysis(ingredients, product_name))
+        return analyses[key]
+
+    async def analyze(ingredients: str, product_name: str, code: str = None) -> BatchItemResult:
+        try:
+            analysis = await shared_analysis(ingredients, product_name)
+        except Exception as e:
+            return BatchItemResult(index=-1, code=code, product_name=product_name, status="error", error=str(e))
+        if analysis.startswith(watson_ai_service.ERROR_PREFIX):
+            return BatchItemResult(index=-1, code=code, product_name=product_name, status="error", error=analysis)
+        return BatchItemResult(index=-1, code=code, product_name=product_name, analysis=analysis)
+
+    async def analyze_code(code: str) -> BatchItemResult:
+        try:
+            product = await openfoodfacts_service.get_product_details(code)
+        except resilience.CircuitOpen as e:
+            return BatchItemResult(index=-1, code=code, status="error", error=str(e))
+        except Exception as e:
+            return BatchItemResult(index=-1, code=code, status="error", error=f"Product lookup failed: {e}")
+        if not product or not product.ingredients_text:
+            return BatchItemResult(index=-1, code=code, status="error", error="Product ingredients not found")
+        return await analyze(product.ingredients_text, product.product_name, code=code)
+
+    # Group duplicate inputs so each unique one is worked on once
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    work: Dict[Tuple[str, str], object] = {}
+    for index, code in enumerate(codes):
+        code = code.strip()
+        group = ("code", code)
+        if group not in groups:
+            work[group] = analyze_code(code)
+        groups.setdefault(group, []).append(index)
+    for offset, item in enumerate(items):
+        group = ("ingredients", watson_ai_service.analysis_key(item.ingredients_text, item.product_name))
+        if group not in groups:
+            work[group] = analyze(item.ingredients_text, item.product_name)
+        groups.setdefault(group, []).append(len(codes) + offset)
+
+    async def tagged(group, coro):
+        return group, await coro
+
+    tasks = [asyncio.ensure_future(tagged(group, coro)) for group, coro in work.items()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            group, result = await next_done
+            for index in groups[group]:
+                yield result.model_copy(update={"index": index})
+    finally:
+        # Client disconnected or we are done; don't leave orphaned work behind
+        for task in tasks:
+            task.cancel()
+        for task in analyses.values():
+            task.cancel()
@@ -0,0 +1,320 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Returned by `TieredCache.get` when nothing usable is cached.
+# A cached `None` is a valid (negative) entry, so we need a distinct marker.
+MISS = object()
+
+_registry: Dict[str, "TieredCache"] = {}
+
+# How often (seconds) a worker checks whether another worker invalidated entries
+GENERATION_CHECK_INTERVAL = 1.0
+
+# Longest a cache call waits for another worker's write lock. Calls come from the
+# event loop, so a write that would wait longer is skipped instead: the value is
+# still in this worker's memory tier and is simply fetched again elsewhere.
+BUSY_TIMEOUT_MS = 50
+
+
+class TieredCache:
+    """
+    Two-level cache: a size-bounded in-process LRU in front of an optional
+    SQLite table that survives restarts.
+
+    Values must be JSON-serialisable. Storing `None` records a negative result
+    ("not found") which is kept for `negative_ttl` seconds instead of `ttl`.
+    Safe to use from the event loop and from worker threads.
+
+    The SQLite tier is shared by every process using the same `db_path`, so
+    all workers of a multi-process server see each other's entries.
+    `max_entries=0` turns the memory tier off, for values other processes update.
+    `delete` and `clear` bump a generation counter stored next to the entries;
+    every process drops its memory tier when it sees a new generation (checked
+    at most every GENERATION_CHECK_INTERVAL seconds), so an invalidation in one
+    worker reaches all of them.
+
+    With `stale_ttl`, expired entries are kept that much longer: `get` treats
+    them as misses, but `get_stale` still returns them, so a caller can answer
+    with the old value while it fetches a new one (stale-while-revalidate).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl: float,
+        negative_ttl: float = 0.0,
+        db_path: Optional[str] = None,
+        stale_ttl: float = 0.0,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._generation = 0
+        self._generation_checked_at = 0.0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+        self.skipped_writes = 0
+
+        if db_path:
+            self._open_db(db_path)
+        _registry[name] = self
+
+    # --- Disk tier ---
+
+    def _open_db(self, db_path: str) -> None:
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            # Several server workers share this file: wait briefly for a writer (see BUSY_TIMEOUT_MS),
+            # and read through a shared memory map rather than per-process page copies
+            db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            db.execute("PRAGMA mmap_size=268435456")
+            db.execute(
+                f'CREATE TABLE IF NOT EXISTS "cache_{self.name}" '
+                "(key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS cache_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+            self._db = db
+            self._generation = self._disk_generation()
+            self._generation_checked_at = time.monotonic()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}': disk tier disabled ({e})")
+            self._db = None
+
+    def _disk_get(self, key: str, stale: bool = False):
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    f'SELECT value, expires_at FROM "cache_{self.name}" WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}': disk read failed ({e})")
+            return None
+        if row is None or row[1] + (self.stale_ttl if stale else 0.0) <= time.time():
+            return None
+        value = None if row[0] is None else json.loads(row[0])
+        return row[1], value
+
+    def _disk_set(self, key: str, value: Any, expires_at: float) -> None:
+        if self._db is None:
+            return
+        payload = None if value is None else json.dumps(value)
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    f'INSERT OR REPLACE INTO "cache_{self.name}" (key, value, expires_at) VALUES (?, ?, ?)',
+                    (key, payload, expires_at),
+                )
+                self._writes_since_prune += 1
+                if self._writes_since_prune >= 500:
+                    self._writes_since_prune = 0
+                    self._db.execute(
+                        f'DELETE FROM "cache_{self.name}" WHERE expires_at <= ?', (time.time() - self.stale_ttl,)
+                    )
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e):
+                logger.warning(f"Cache '{self.name}': disk write failed ({e})")
+                return
+            with self._lock:
+                self.skipped_writes += 1
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}': disk write failed ({e})")
+
+    def _disk_delete(self, key: Optional[str]) -> None:
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN IMMEDIATE")
+                try:
+                    if key is None:
+                        self._db.execute(f'DELETE FROM "cache_{self.name}"')
+                    else:
+                        self._db.execute(f'DELETE FROM "cache_{self.name}" WHERE key = ?', (key,))
+                    # Tell every worker, this one included, to drop its memory tier on the next check
+                    self._db.execute(
+                        "INSERT INTO cache_generations (name, generation) VALUES (?, 1) "
+                        "ON CONFLICT(name) DO UPDATE SET generation = generation + 1",
+                        (self.name,),
+                    )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}': disk delete failed ({e})")
+
+    def _disk_generation(self) -> int:
+        with self._db_lock:
+            row = self._db.execute("SELECT generation FROM cache_generations WHERE name = ?", (self.name,)).fetchone()
+        return row[0] if row else 0
+
+    def _check_generation(self) -> None:
+        """Drop the memory tier if some process invalidated entries since the last check."""
+        if self._db is None or self.max_entries <= 0:
+            return
+        now = time.monotonic()
+        if now - self._generation_checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        self._generation_checked_at = now
+        try:
+            generation = self._disk_generation()
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}': generation check failed ({e})")
+            return
+        if generation != self._generation:
+            with self._lock:
+                self._memory.clear()
+            self._generation = generation
+
+    # --- Memory tier ---
+
+    def _memory_put(self, key: str, value: Any, expires_at: float) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+    # --- Public API ---
+
+    def get(self, key: str) -> Any:
+        """Return the cached value (possibly `None` for a negative entry) or `MISS`."""
+        self._check_generation()
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    if entry[1] is None:
+                        self.negative_hits += 1
+                    return entry[1]
+                if entry[0] + self.stale_ttl <= now:
+                    del self._memory[key]
+
+        entry = self._disk_get(key)
+        if entry is None:
+            with self._lock:
+                self.misses += 1
+            return MISS
+
+        expires_at, value = entry
+        self._memory_put(key, value, expires_at)
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+            if value is None:
+                self.negative_hits += 1
+        return value
+
+    def peek(self, key: str) -> Tuple[Any, float]:
+        """
+        `(value, expires_at)` of an entry, fresh or stale, else `(MISS, 0.0)`.
+        Not counted as a lookup and does not refresh the LRU order.
+        """
+        self._check_generation()
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is None or entry[0] + self.stale_ttl <= time.time():
+            entry = self._disk_get(key, stale=True)
+        if entry is None:
+            return MISS, 0.0
+        return entry[1], entry[0]
+
+    def get_stale(self, key: str, after_miss: bool = False) -> Any:
+        """
+        Like `get`, but an expired entry still inside `stale_ttl` is returned instead of `MISS`.
+        With `after_miss`, for a caller whose own `get` just missed, only the stale
+        entry is looked up: the fresh lookup is neither repeated nor counted twice.
+        """
+        if not after_miss:
+            value = self.get(key)
+            if value is not MISS:
+                return value
+        if self.stale_ttl <= 0:
+            return MISS
+        value, expires_at = self.peek(key)
+        if value is not MISS:
+            self._memory_put(key, value, expires_at)
+            with self._lock:
+                self.stale_hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._memory_put(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        self._disk_delete(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        self._disk_delete(None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+                "evictions": self.evictions,
+                "skipped_writes": self.skipped_writes,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    """True if another connection held the lock past BUSY_TIMEOUT_MS."""
+    return "database is locked" in str(error) or "database is busy" in str(error)
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every cache created in this process, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,144 @@
+import io
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+# Pillow is optional: without it uploads go to OCR untouched and near-duplicate detection is off.
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Edge strength (0-255) that counts as "ink" when looking for the text region
+EDGE_THRESHOLD = 40
+# Ignore a detected text region smaller than this fraction of the image (noise, glare)
+MIN_TEXT_AREA = 0.02
+# Side of the confirming hash (FINE_HASH_SIZE**2 bits): fine enough that different words differ
+FINE_HASH_SIZE = 32
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def dhash(image: "Image.Image", size: int = 8) -> int:
+    """
+    `size`*`size`-bit difference hash: robust to rescaling, recompression and small
+    lighting changes. At the default 64 bits it captures a label's layout, not its words.
+    """
+    small = image.convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def _crop_to_text(image: "Image.Image") -> "Image.Image":
+    width, height = image.size
+    if width < 3 or height < 3:
+        return image
+    edges = image.filter(ImageFilter.FIND_EDGES).point(lambda p: 255 if p > EDGE_THRESHOLD else 0)
+    # The edge filter lights up the outermost pixel ring; ignore it
+    bbox = edges.crop((1, 1, width - 1, height - 1)).getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = (v + 1 for v in bbox)
+    if (right - left) * (bottom - top) < MIN_TEXT_AREA * width * height:
+        return image
+    margin_x, margin_y = int(width * 0.02), int(height * 0.02)
+    return image.crop((
+        max(0, left - margin_x),
+        max(0, top - margin_y),
+        min(width, right + margin_x),
+        min(height, bottom + margin_y),
+    ))
+
+
+def preprocess(contents: bytes, max_dimension: int) -> Tuple[bytes, Optional[Tuple[int, int]]]:
+    """
+    Prepare a label photo for OCR: fix EXIF rotation, grayscale, downscale so the
+    longest side is at most `max_dimension`, and crop to the region with text.
+
+    Returns the re-encoded JPEG and its fingerprint: a 64-bit hash to find
+    candidates and a FINE_HASH_SIZE**2-bit hash of the text region to confirm them.
+    Blocking and CPU bound. If Pillow is missing or the image cannot be decoded,
+    returns the original bytes and no fingerprint.
+    """
+    if Image is None:
+        return contents, None
+    try:
+        image = Image.open(io.BytesIO(contents))
+        image = ImageOps.exif_transpose(image).convert("L")
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        image = _crop_to_text(image)
+        fingerprint = dhash(image), dhash(image, FINE_HASH_SIZE)
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=85, optimize=True)
+        return out.getvalue(), fingerprint
+    except Exception as e:
+        logger.warning(f"Image preprocessing failed, using original upload: {e}")
+        return contents, None
+
+
+class PerceptualHashIndex:
+    """
+    Bounded map from image fingerprint to a previous result, so a second photo of
+    the same label finds the first one's OCR and analysis.
+
+    The 64-bit hash only shortlists candidates (within `max_distance` bits): two
+    different labels with the same layout are that close. A candidate is a match
+    only if its fine hash of the text region is within `max_fine_distance` bits too.
+    """
+
+    def __init__(self, max_entries: int, max_distance: int, max_fine_distance: int):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_fine_distance = max_fine_distance
+        # fine hash -> (coarse hash, value)
+        self._entries: "OrderedDict[int, Tuple[int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def find(self, fingerprint: Tuple[int, int]) -> Optional[Any]:
+        coarse, fine = fingerprint
+        with self._lock:
+            best_key, best_distance = None, self.max_fine_distance + 1
+            candidates = 0
+            for key, (entry_coarse, _) in self._entries.items():
+                if (entry_coarse ^ coarse).bit_count() > self.max_distance:
+                    continue
+                candidates += 1
+                distance = (key ^ fine).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        break
+            if best_key is None:
+                self.misses += 1
+                # Same layout, different text
+                self.rejected += bool(candidates)
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][1]
+
+    def add(self, fingerprint: Tuple[int, int], value: Any) -> None:
+        coarse, fine = fingerprint
+        with self._lock:
+            self._entries[fine] = (coarse, value)
+            self._entries.move_to_end(fine)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "rejected": self.rejected}
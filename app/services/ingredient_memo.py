@@ -0,0 +1,138 @@
+import re
+from typing import Dict, List, Optional
+from app.config import get_settings
+from app.services.cache import TieredCache, MISS
+from app.services.rule_engine import normalize_label_text
+
+settings = get_settings()
+
+# Per-ingredient LLM assessments, shared by every product that lists the ingredient.
+# Keys carry the model and prompt version (see `key`), so a prompt change starts a fresh catalog.
+assessment_cache = TieredCache(
+    "ingredient",
+    max_entries=settings.ingredient_memo_size,
+    ttl=settings.ingredient_memo_ttl,
+    db_path=settings.cache_db_path or None,
+)
+
+CONCERN_LEVELS = ("Low", "Medium", "High")
+
+# Longer "ingredients" are run-on OCR text or a sentence, not something worth memoizing
+MAX_INGREDIENT_CHARS = 60
+
+_PERCENT = re.compile(r"\d+(?:[.,]\d+)?\s*%")
+# Sub-index of an INS code: "322(i)", "503(ii)"
+_SUB_INDEX = re.compile(r"(?<=\d)\s*\(\s*[ivx]+\s*\)")
+# Bare INS number listed under a class name: "emulsifier (471)"
+_BARE_CODE = re.compile(r"^\d{3,4}[a-f]?$")
+_LEADING_NOISE = re.compile(r"^(?:ingredients?|contains?|and|with)\b\s*[:\-]?\s*")
+_EDGE_CHARS = " \t.:*-_"
+_OPEN, _CLOSE = "([{", ")]}"
+
+
+def canonical(name: str) -> str:
+    """One ingredient as its memo key: normalized E-numbers, no percentages or label noise."""
+    name = _PERCENT.sub("", normalize_label_text(name))
+    name = _LEADING_NOISE.sub("", name.strip(_EDGE_CHARS))
+    name = " ".join(name.split()).strip(_EDGE_CHARS)
+    if _BARE_CODE.match(name):
+        return f"e{name}"
+    if len(name) > MAX_INGREDIENT_CHARS or not any(ch.isalpha() for ch in name):
+        return ""
+    return name
+
+
+def _split(text: str) -> List[str]:
+    """Split on commas, semicolons and sentence-ending periods outside brackets."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch in _OPEN:
+            depth += 1
+        elif ch in _CLOSE:
+            depth = max(0, depth - 1)
+        elif depth == 0 and (ch in ",;" or (ch == "." and text[i + 1:i + 2] in ("", " "))):
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _unwrap(part: str):
+    """`wheat flour (maida) (62%)` -> ("wheat flour", ["maida", "62%"])."""
+    base, groups, depth, start = [], [], 0, 0
+    for i, ch in enumerate(part):
+        if ch in _OPEN:
+            if depth == 0:
+                base.append(part[start:i])
+                start = i + 1
+            depth += 1
+        elif ch in _CLOSE and depth:
+            depth -= 1
+            if depth == 0:
+                groups.append(part[start:i])
+                start = i + 1
+    if depth:
+        # Unclosed bracket: treat the rest as one more group
+        groups.append(part[start:])
+    else:
+        base.append(part[start:])
+    return "".join(base), groups
+
+
+def tokenize(ingredients: str) -> List[str]:
+    """
+    Canonical ingredients of an `ingredients_text`, in label order, without
+    duplicates. Bracketed sub-ingredients are listed after their parent:
+    `edible vegetable oil (palm oil), emulsifier (e471, e322)` ->
+    ["edible vegetable oil", "palm oil", "emulsifier", "e471", "e322"].
+    """
+    names: List[str] = []
+
+    def walk(text: str) -> None:
+        for part in _split(text):
+            base, groups = _unwrap(part)
+            name = canonical(base)
+            if name and name not in names:
+                names.append(name)
+            for group in groups:
+                walk(group)
+
+    # Normalize first, so "INS 322(i)" is one code and not "ins 322" plus a bracket
+    walk(_SUB_INDEX.sub("", normalize_label_text(ingredients)))
+    return names
+
+
+def key(name: str, version: str) -> str:
+    return f"{version}:{name}"
+
+
+def lookup(names: List[str], version: str) -> Dict[str, dict]:
+    """Memoized assessments for whichever of `names` are already known."""
+    known = {}
+    for name in names:
+        assessment = assessment_cache.get(key(name, version))
+        if assessment is not MISS and assessment is not None:
+            known[name] = assessment
+    return known
+
+
+def store(name: str, concern: str, note: str, version: str) -> Optional[dict]:
+    """Remember one assessment; returns it, or None if `concern` is not a known level."""
+    concern = concern.strip().capitalize()
+    if concern not in CONCERN_LEVELS:
+        return None
+    assessment = {"ingredient": name, "concern": concern, "note": note.strip()}
+    assessment_cache.set(key(name, version), assessment)
+    return assessment
+
+
+def render(names: List[str], assessments: Dict[str, dict]) -> str:
+    """One `name: Concern concern. Note` line per ingredient, in label order."""
+    lines = []
+    for name in names:
+        assessment = assessments.get(name)
+        if assessment is None:
+            lines.append(f"{name}: not assessed")
+        else:
+            lines.append(f"{name}: {assessment['concern']} concern. {assessment['note']}".rstrip())
+    return "\n".join(lines)
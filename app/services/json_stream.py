@@ -0,0 +1,142 @@
+import json
+from typing import Any, List, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class ObjectStreamParser:
+    """
+    Single-pass parser for one JSON object that arrives in chunks (LLM tokens).
+
+    `feed()` returns each top-level `(key, value)` member as soon as its value
+    is complete, so callers can act on early fields while later ones are still
+    being generated. `done` turns true when the object's closing brace arrives;
+    anything after it is ignored, which is the caller's cue to stop generating.
+
+    Text before the opening brace (a code fence, "Here is the JSON:") is
+    skipped. A member whose value is not valid JSON is dropped and recorded in
+    `errors`; the rest of the object is still parsed.
+    """
+
+    def __init__(self):
+        self.done = False
+        self.errors: List[str] = []
+        self._state = "seek"
+        self._key: List[str] = []
+        self._current_key = ""
+        self._value: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        members: List[Tuple[str, Any]] = []
+        for ch in chunk:
+            if self.done:
+                break
+            state = self._state
+
+            if state == "seek":
+                if ch == "{":
+                    self._state = "key_start"
+
+            elif state == "key_start":
+                if ch == '"':
+                    self._key = []
+                    self._state = "key"
+                elif ch == "}":
+                    self.done = True
+                # Whitespace and stray commas are skipped
+
+            elif state == "key":
+                if self._escaped:
+                    self._key.append(ch)
+                    self._escaped = False
+                elif ch == "\\":
+                    self._key.append(ch)
+                    self._escaped = True
+                elif ch == '"':
+                    self._current_key = self._decode_key()
+                    self._state = "colon"
+                else:
+                    self._key.append(ch)
+
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value_start"
+
+            elif state == "value_start":
+                if ch in _WHITESPACE:
+                    continue
+                self._value = []
+                self._depth = 0
+                self._in_string = False
+                self._state = "value"
+                self._value_char(ch, members)
+
+            elif state == "value":
+                self._value_char(ch, members)
+
+            elif state == "after_value":
+                if ch == ",":
+                    self._state = "key_start"
+                elif ch == "}":
+                    self.done = True
+        return members
+
+    def _decode_key(self) -> str:
+        raw = "".join(self._key)
+        try:
+            return json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            return raw
+
+    def _value_char(self, ch: str, members: List[Tuple[str, Any]]) -> None:
+        if self._in_string:
+            self._value.append(ch)
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._emit(members)
+            return
+
+        if ch == '"':
+            self._in_string = True
+            self._value.append(ch)
+        elif ch in "[{":
+            self._depth += 1
+            self._value.append(ch)
+        elif ch in "]}":
+            if self._depth == 0:
+                # Closing brace of the whole object right after a bare scalar
+                self._emit(members)
+                self.done = ch == "}"
+                return
+            self._depth -= 1
+            self._value.append(ch)
+            if self._depth == 0:
+                self._emit(members)
+        elif ch == "," and self._depth == 0:
+            # End of a bare scalar (number, true/false/null)
+            self._emit(members)
+            self._state = "key_start"
+        elif ch in _WHITESPACE and self._depth == 0:
+            if "".join(self._value).strip():
+                self._emit(members)
+        else:
+            self._value.append(ch)
+
+    def _emit(self, members: List[Tuple[str, Any]]) -> None:
+        raw = "".join(self._value).strip()
+        self._value = []
+        self._state = "after_value"
+        if not raw:
+            return
+        try:
+            members.append((self._current_key, json.loads(raw)))
+        except json.JSONDecodeError as e:
+            self.errors.append(f"{self._current_key}: {e}")
@@ -0,0 +1,155 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Optional
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from app import logging_setup
+from app.services import cache, resilience, singleflight, tracing
+
+# Upstream calls range from a few ms (OFF, cached DNS) to tens of seconds (LLM generation)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to serve an HTTP request, by route template",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served", ["method", "route"],
+    multiprocess_mode="livesum",
+)
+REQUEST_ERRORS = Counter(
+    "http_request_errors_total", "HTTP requests that ended in a 5xx or an unhandled exception",
+    ["method", "route", "status"],
+)
+
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds", "Time spent in calls to external services",
+    ["upstream", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "upstream_requests_in_flight", "Calls to external services currently outstanding", ["upstream", "operation"],
+    multiprocess_mode="livesum",
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_errors_total", "Failed calls to external services, by exception type",
+    ["upstream", "operation", "error"],
+)
+
+HEDGED_REQUESTS = Counter(
+    "upstream_hedged_requests_total", "Duplicate requests sent because the first was slow or failed", ["upstream"],
+)
+DEGRADED_RESPONSES = Counter(
+    "degraded_responses_total", "Answers served from a fallback instead of the upstream", ["upstream", "reason"],
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Tokens sent to and generated by the LLM", ["model", "kind"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth", "Calls waiting for an upstream slot, by priority", ["upstream", "priority"],
+    multiprocess_mode="livesum",
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds", "Time calls waited for an upstream slot; outcome is admitted or shed",
+    ["upstream", "priority", "outcome"], buckets=LATENCY_BUCKETS,
+)
+INGREDIENT_ASSESSMENTS = Counter(
+    "ingredient_assessments_total", "Per-ingredient assessments used by incremental analysis, by where they came from",
+    ["source"],
+)
+
+
+@contextmanager
+def track(upstream: str, operation: str):
+    """
+    Time one call to an external service: latency histogram, in-flight gauge,
+    error counter, and a `<upstream>.<operation>` span on the current trace.
+    Works in threads and in coroutines.
+    """
+    in_flight = UPSTREAM_IN_FLIGHT.labels(upstream, operation)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        with tracing.span(f"{upstream}.{operation}"):
+            yield
+    except BaseException as e:
+        outcome = "error"
+        UPSTREAM_ERRORS.labels(upstream, operation, type(e).__name__).inc()
+        raise
+    finally:
+        in_flight.dec()
+        UPSTREAM_LATENCY.labels(upstream, operation, outcome).observe(time.perf_counter() - started)
+
+
+def record_tokens(model: str, input_tokens: Optional[int], generated_tokens: Optional[int]) -> None:
+    if input_tokens:
+        LLM_TOKENS.labels(model, "input").inc(input_tokens)
+    if generated_tokens:
+        LLM_TOKENS.labels(model, "generated").inc(generated_tokens)
+
+
+class _StatsCollector:
+    """Exports the caches' and single-flight groups' own counters at scrape time."""
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups answered from the cache", labels=["cache", "tier"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that fell through", labels=["cache"])
+        stale = CounterMetricFamily("cache_stale_hits", "Misses answered with an expired entry while it is refetched", labels=["cache"])
+        evictions = CounterMetricFamily("cache_evictions", "Entries evicted from the in-memory tier", labels=["cache"])
+        skipped = CounterMetricFamily("cache_skipped_writes", "Disk writes skipped because another worker held the lock", labels=["cache"])
+        ratio = GaugeMetricFamily("cache_hit_ratio", "Hits / lookups since start", labels=["cache"])
+        entries = GaugeMetricFamily("cache_entries", "Entries in the in-memory tier", labels=["cache"])
+        for name, stats in cache.all_stats().items():
+            # `hits` includes the disk and negative hits
+            hits.add_metric([name, "memory"], stats["hits"] - stats["disk_hits"])
+            hits.add_metric([name, "disk"], stats["disk_hits"])
+            misses.add_metric([name], stats["misses"])
+            stale.add_metric([name], stats["stale_hits"])
+            evictions.add_metric([name], stats["evictions"])
+            skipped.add_metric([name], stats["skipped_writes"])
+            ratio.add_metric([name], stats["hit_ratio"])
+            entries.add_metric([name], stats["entries"])
+        yield from (hits, misses, stale, evictions, skipped, ratio, entries)
+
+        calls = CounterMetricFamily("coalesced_calls", "Calls made through a single-flight group", labels=["group"])
+        collapsed = CounterMetricFamily("coalesced_collapsed", "Calls that joined one already running", labels=["group"])
+        for name, stats in singleflight.all_stats().items():
+            calls.add_metric([name], stats["calls"])
+            collapsed.add_metric([name], stats["collapsed"])
+        yield from (calls, collapsed)
+
+        state = GaugeMetricFamily(
+            "circuit_breaker_open", "1 while the breaker is open or half-open", labels=["upstream"]
+        )
+        rejected = CounterMetricFamily("circuit_breaker_rejected", "Calls failed fast by an open breaker", labels=["upstream"])
+        for name, stats in resilience.all_stats().items():
+            state.add_metric([name], 0 if stats["state"] == "closed" else 1)
+            rejected.add_metric([name], stats["rejected"])
+        yield from (state, rejected)
+
+        log_stats = logging_setup.stats()
+        yield GaugeMetricFamily("log_queue_depth", "Log records waiting for the writer thread", value=log_stats["queued"])
+        yield CounterMetricFamily("log_records_dropped", "Log records dropped because the queue was full", value=log_stats["dropped"])
+
+
+_stats_collector = _StatsCollector()
+REGISTRY.register(_stats_collector)
+
+
+def render() -> tuple:
+    """
+    Current metrics in the Prometheus text format, with its content type.
+
+    Under a multi-process server (PROMETHEUS_MULTIPROC_DIR set, see gunicorn.conf.py)
+    counters and histograms are summed over all workers; the cache, breaker and
+    log-queue figures are those of the worker that served the scrape.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_stats_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
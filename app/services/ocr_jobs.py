@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from app.config import get_settings
+from app.models.analysis_models import OCRJob
+from app.services import watson_ai_service, watson_ocr_service
+from app.services.cache import MISS, TieredCache
+from app.services.image_preprocess import PerceptualHashIndex, preprocess
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+OCR_PRODUCT_NAME = "Uploaded Image Product"
+SHARED_POLL_INTERVAL = 0.25
+
+
+class QueueFull(Exception):
+    """Raised when the OCR queue is at capacity; callers should ask the client to retry later."""
+
+
+class _Pending:
+    __slots__ = ("job", "contents", "filename", "done")
+
+    def __init__(self, job: OCRJob, contents: bytes, filename: str):
+        self.job = job
+        self.contents = contents
+        self.filename = filename
+        self.done = asyncio.Event()
+
+
+# Results of recent jobs by perceptual hash, so re-photographing a label skips OCR and the LLM
+seen_images = PerceptualHashIndex(
+    max_entries=settings.ocr_phash_cache_size,
+    max_distance=settings.ocr_phash_distance,
+    max_fine_distance=settings.ocr_phash_confirm_distance,
+)
+
+# Job snapshots in the shared cache tier, so any worker of a multi-process server can answer
+# status polls for a job another worker is running. Disk only: the owner keeps updating them.
+shared_jobs = TieredCache(
+    "ocr_jobs",
+    max_entries=0,
+    ttl=settings.ocr_job_ttl,
+    db_path=settings.cache_db_path or None,
+)
+
+_queue: Optional[asyncio.Queue] = None
+_jobs: Dict[str, _Pending] = {}
+_workers: List[asyncio.Task] = []
+# OCR backends block (Discovery polling, tesseract); they get their own threads
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+async def start() -> None:
+    """Start the OCR worker pool. Called from the app lifespan."""
+    global _queue, _executor
+    if _workers:
+        return
+    _queue = asyncio.Queue(maxsize=settings.ocr_queue_size)
+    _executor = ThreadPoolExecutor(max_workers=settings.ocr_workers, thread_name_prefix="ocr")
+    for n in range(settings.ocr_workers):
+        _workers.append(asyncio.create_task(_worker(n), name=f"ocr-worker-{n}"))
+
+
+async def stop() -> None:
+    global _executor
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _publish(job: OCRJob) -> None:
+    shared_jobs.set(job.id, job.model_dump())
+
+
+def _purge_expired() -> None:
+    cutoff = time.time() - settings.ocr_job_ttl
+    for job_id in [j for j, p in _jobs.items() if p.done.is_set() and p.job.finished_at < cutoff]:
+        del _jobs[job_id]
+
+
+def submit(contents: bytes, filename: str) -> OCRJob:
+    """Queue an image for OCR + analysis and return its job immediately."""
+    if _queue is None:
+        raise RuntimeError("OCR workers are not running")
+    _purge_expired()
+    job = OCRJob(id=uuid.uuid4().hex, status="queued", created_at=time.time(), product_name=OCR_PRODUCT_NAME)
+    pending = _Pending(job, contents, filename)
+    try:
+        _queue.put_nowait(pending)
+    except asyncio.QueueFull:
+        raise QueueFull()
+    _jobs[job.id] = pending
+    _publish(job)
+    return job
+
+
+def get(job_id: str) -> Optional[OCRJob]:
+    pending = _jobs.get(job_id)
+    if pending is not None:
+        return pending.job
+    # Submitted to another worker
+    snapshot = shared_jobs.get(job_id)
+    return None if snapshot is MISS or snapshot is None else OCRJob(**snapshot)
+
+
+async def wait(job_id: str, timeout: Optional[float] = None) -> Optional[OCRJob]:
+    """Wait (without blocking a thread) until the job finishes or `timeout` passes."""
+    pending = _jobs.get(job_id)
+    if pending is None:
+        return await _wait_shared(job_id, timeout)
+    try:
+        await asyncio.wait_for(pending.done.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return pending.job
+
+
+async def _wait_shared(job_id: str, timeout: Optional[float]) -> Optional[OCRJob]:
+    # Another worker owns the job; poll its published snapshot
+    deadline = time.monotonic() + (timeout or 0)
+    while True:
+        job = get(job_id)
+        if job is None or job.status in ("done", "failed") or time.monotonic() >= deadline:
+            return job
+        await asyncio.sleep(SHARED_POLL_INTERVAL)
+
+
+def stats() -> dict:
+    return {
+        "queued": _queue.qsize() if _queue else 0,
+        "capacity": settings.ocr_queue_size,
+        "workers": len(_workers),
+        "jobs": len(_jobs),
+        "dedup": seen_images.stats(),
+    }
+
+
+async def _worker(n: int) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        pending: _Pending = await _queue.get()
+        job = pending.job
+        job.status = "processing"
+        _publish(job)
+        try:
+            contents, fingerprint = await loop.run_in_executor(
+                _executor, preprocess, pending.contents, settings.ocr_max_dimension
+            )
+            # The original upload is no longer needed
+            pending.contents = b""
+
+            previous = seen_images.find(fingerprint) if fingerprint is not None else None
+            if previous is not None:
+                job.extracted_text, job.analysis = previous
+                job.deduplicated = True
+                job.status = "done"
+                continue
+
+            backend = watson_ocr_service.get_backend()
+            filename = pending.filename
+            if fingerprint is not None:
+                # preprocess re-encoded the image as JPEG; Discovery picks the type from the extension
+                filename = os.path.splitext(filename or "upload")[0] + ".jpg"
+            text = await loop.run_in_executor(_executor, backend, contents, filename)
+            job.extracted_text = text
+            if text.startswith("Error"):
+                job.status = "failed"
+                job.error = text
+            else:
+                job.analysis = await watson_ai_service.analyze_ingredients_async(text, product_name=job.product_name)
+                job.status = "done"
+                reusable = not (
+                    job.analysis.startswith(watson_ai_service.ERROR_PREFIX) or watson_ai_service.is_degraded(job.analysis)
+                )
+                if fingerprint is not None and reusable:
+                    seen_images.add(fingerprint, (text, job.analysis))
+        except asyncio.CancelledError:
+            job.status = "failed"
+            job.error = "Server shutting down"
+            raise
+        except Exception as e:
+            logger.exception(f"OCR job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = "A system error occurred while processing the image."
+        finally:
+            job.finished_at = time.time()
+            _publish(job)
+            pending.done.set()
+            _queue.task_done()
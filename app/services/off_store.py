@@ -0,0 +1,268 @@
+"""
+Local, indexed copy of the Open Food Facts data export.
+
+Build or refresh it from the OFF dumps (https://world.openfoodfacts.org/data):
+
+    python -m app.services.off_store import openfoodfacts-products.jsonl.gz
+    python -m app.services.off_store import en.openfoodfacts.org.products.csv.gz
+    python -m app.services.off_store import delta/products_1700000000.json.gz   # incremental
+
+Only the fields the API serves are kept, so a multi-GB dump becomes a compact
+SQLite file with a barcode primary key and an FTS5 index over name and brand.
+Rows are streamed and written in batches, so memory stays flat regardless of
+dump size. Re-importing (or importing a delta) only replaces a product when the
+incoming record is at least as new as the stored one.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import logging
+import re
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Fields kept from each OFF product record
+STORED_FIELDS = (
+    "code",
+    "product_name",
+    "brands",
+    "image_front_url",
+    "image_front_small_url",
+    "ingredients_text",
+    "nutriments",
+)
+
+# Keep only per-100g nutriment values; the full dict has a dozen variants per nutrient
+_NUTRIMENT_SUFFIX = "_100g"
+
+# Kept even when empty: `/barcode/{code}` serves the stored dict and its response model requires them
+REQUIRED_FIELDS = ("code", "product_name")
+
+_FTS_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def compact(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Reduce an OFF product record to STORED_FIELDS and per-100g nutriments; None without a code.
+    Empty fields are dropped, except REQUIRED_FIELDS, which become "".
+    """
+    code = str(record.get("code") or "").strip()
+    if not code:
+        return None
+    product = {field: record.get(field) for field in STORED_FIELDS if record.get(field) not in (None, "")}
+    product["code"] = code
+    for field in REQUIRED_FIELDS:
+        product.setdefault(field, "")
+    nutriments = record.get("nutriments")
+    if isinstance(nutriments, dict):
+        product["nutriments"] = {k: v for k, v in nutriments.items() if k.endswith(_NUTRIMENT_SUFFIX)}
+    return product
+
+
+def _open_text(path: str) -> io.TextIOBase:
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from an OFF JSONL export (one product per line)."""
+    with _open_text(path) as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning(f"{path}:{line_no}: skipping malformed JSON line")
+
+
+def iter_csv(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from the OFF CSV export (tab separated despite the name)."""
+    csv.field_size_limit(sys.maxsize)
+    with _open_text(path) as f:
+        for row in csv.DictReader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+            nutriments = {}
+            for column, value in row.items():
+                if column and column.endswith(_NUTRIMENT_SUFFIX) and value:
+                    try:
+                        nutriments[column] = float(value)
+                    except ValueError:
+                        pass
+            yield {
+                "code": row.get("code"),
+                "product_name": row.get("product_name"),
+                "brands": row.get("brands"),
+                "image_front_url": row.get("image_url"),
+                "image_front_small_url": row.get("image_small_url"),
+                "ingredients_text": row.get("ingredients_text"),
+                "last_modified_t": row.get("last_modified_t"),
+                "nutriments": nutriments,
+            }
+
+
+def iter_dump(path: str) -> Iterator[Dict[str, Any]]:
+    name = path.lower()
+    if ".csv" in name or ".tsv" in name:
+        return iter_csv(path)
+    return iter_jsonl(path)
+
+
+class OffStore:
+    """SQLite-backed product store keyed by barcode with full-text search over name and brand."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS products "
+            "(code TEXT PRIMARY KEY, last_modified INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts "
+            "USING fts5(code UNINDEXED, product_name, brands)"
+        )
+
+    def get(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT data FROM products WHERE code = ?", (code,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Products whose name/brand contain every query word (prefix match), best BM25 first."""
+        tokens = _FTS_TOKEN.findall(query.lower())
+        if not tokens:
+            return []
+        match = " ".join(f'"{token}"*' for token in tokens)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT p.data FROM products_fts f JOIN products p ON p.code = f.code "
+                "WHERE products_fts MATCH ? ORDER BY bm25(products_fts) LIMIT ?",
+                (match, limit),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def upsert_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Insert or update raw OFF records in one transaction. Returns how many rows changed."""
+        changed = 0
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for record in records:
+                    product = compact(record)
+                    if product is None:
+                        continue
+                    try:
+                        last_modified = int(record.get("last_modified_t") or 0)
+                    except (TypeError, ValueError):
+                        last_modified = 0
+                    cursor = self._db.execute(
+                        "INSERT INTO products (code, last_modified, data) VALUES (?, ?, ?) "
+                        "ON CONFLICT(code) DO UPDATE SET last_modified = excluded.last_modified, data = excluded.data "
+                        "WHERE excluded.last_modified >= products.last_modified",
+                        (product["code"], last_modified, json.dumps(product, separators=(",", ":"))),
+                    )
+                    if cursor.rowcount:
+                        changed += 1
+                        self._db.execute("DELETE FROM products_fts WHERE code = ?", (product["code"],))
+                        self._db.execute(
+                            "INSERT INTO products_fts (code, product_name, brands) VALUES (?, ?, ?)",
+                            (product["code"], product.get("product_name", ""), product.get("brands", "")),
+                        )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return changed
+
+    def optimize(self) -> None:
+        with self._lock:
+            self._db.execute("INSERT INTO products_fts(products_fts) VALUES ('optimize')")
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def import_dump(store: OffStore, path: str, batch_size: int = 2000) -> Dict[str, int]:
+    """Stream a dump (full or delta) into the store. Memory use is bounded by `batch_size`."""
+    seen = changed = 0
+    started = time.monotonic()
+    batch: List[Dict[str, Any]] = []
+    for record in iter_dump(path):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            changed += store.upsert_many(batch)
+            seen += len(batch)
+            batch.clear()
+            if seen % (batch_size * 50) == 0:
+                logger.info(f"{path}: {seen} records read, {changed} stored ({time.monotonic() - started:.0f}s)")
+    if batch:
+        changed += store.upsert_many(batch)
+        seen += len(batch)
+    store.optimize()
+    return {"read": seen, "changed": changed}
+
+
+_store: Optional[OffStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[OffStore]:
+    """The configured local store, or None when `off_store_path` is unset."""
+    global _store
+    if _store is None:
+        from app.config import get_settings
+        path = get_settings().off_store_path
+        if not path:
+            return None
+        with _store_lock:
+            if _store is None:
+                _store = OffStore(path)
+    return _store
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage the local Open Food Facts store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Import a full or delta OFF export (JSONL or CSV, optionally .gz)")
+    imp.add_argument("dumps", nargs="+")
+    imp.add_argument("--db", help="Store path (defaults to OFF_STORE_PATH)")
+    imp.add_argument("--batch-size", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if args.db:
+        db_path = args.db
+    else:
+        from app.config import get_settings
+        db_path = get_settings().off_store_path
+    if not db_path:
+        parser.error("no store path: pass --db or set OFF_STORE_PATH")
+
+    store = OffStore(db_path)
+    try:
+        for dump in args.dumps:
+            result = import_dump(store, dump, batch_size=args.batch_size)
+            logger.info(f"{dump}: {result['read']} records read, {result['changed']} stored")
+        logger.info(f"{db_path}: {store.count()} products")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,126 +1,330 @@
-import requests
-from typing import List, Dict, Any, Set
+import asyncio
+import logging
+import aiohttp
+from typing import List, Dict, Any, Set, Optional
+from app.config import get_settings
 from app.models.product_models import ProductBase, ProductDetail
-from difflib import SequenceMatcher
+from app.services.cache import TieredCache, MISS
+from app.services.singleflight import SingleFlight
+from app.services import off_store, metrics, resilience, refresher
+from app.services.search_index import ProductSearchIndex
 
-OFF_SEARCH_URL = "https://world.openfoodfacts.org/cgi/search.pl"
-OFF_PRODUCT_URL = "https://world.openfoodfacts.org/api/v0/product/"
-OFF_barcode_url = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+logger = logging.getLogger(__name__)
+settings = get_settings()
 
-def search_products(query: str, limit: int = 10) -> List[ProductBase]:
+OFF_SEARCH_URL = f"{settings.off_base_url}/cgi/search.pl"
+OFF_PRODUCT_URL = f"{settings.off_base_url}/api/v0/product/"
+OFF_barcode_url = f"{settings.off_base_url}/api/v0/product/{{barcode}}.json"
+OFF_USER_AGENT = "LabelPadhegaIndia/1.0 (+https://github.com/Aniket-16-S/orbital-aldrin)"
+
+# Ask OFF for only what we use; a full product is often hundreds of KB of images and translations
+PRODUCT_FIELDS = ",".join(off_store.STORED_FIELDS)
+SEARCH_FIELDS = "code,product_name,brands,image_front_small_url"
+
+# One keep-alive pool shared by every request in this process.
+# Created on app startup and closed on shutdown (see app/main.py).
+_session: Optional[aiohttp.ClientSession] = None
+
+# Raw OFF product dicts by barcode; `None` entries remember "product not found".
+product_cache = TieredCache(
+    "off_product",
+    max_entries=settings.product_cache_size,
+    ttl=settings.product_cache_ttl,
+    negative_ttl=settings.product_not_found_ttl,
+    db_path=settings.cache_db_path or None,
+    stale_ttl=settings.product_cache_stale_ttl,
+)
+
+# Fuzzy index over every product we have seen, so repeat and typo'd queries resolve locally
+search_index = ProductSearchIndex(
+    max_docs=settings.search_index_size,
+    min_similarity=settings.search_index_min_similarity,
+)
+
+# Concurrent scans of the same barcode share one OFF request
+_product_flights = SingleFlight("off_product")
+
+# Fail fast while OFF is down instead of every request waiting out its timeout.
+# Search is a separate (and much slower) OFF backend: its failures must not block product reads.
+breaker = resilience.CircuitBreaker(
+    "off",
+    failure_threshold=settings.breaker_failure_threshold,
+    recovery_timeout=settings.breaker_recovery_timeout,
+)
+search_breaker = resilience.CircuitBreaker(
+    "off_search",
+    failure_threshold=settings.breaker_failure_threshold,
+    recovery_timeout=settings.breaker_recovery_timeout,
+)
+
+
+async def startup() -> None:
+    """Create the shared OFF HTTP session. Safe to call more than once."""
+    global _session
+    if _session is not None and not _session.closed:
+        return
+    connector = aiohttp.TCPConnector(
+        limit=settings.off_pool_size,
+        limit_per_host=settings.off_pool_per_host,
+        keepalive_timeout=settings.off_keepalive_timeout,
+        ttl_dns_cache=300,
+    )
+    _session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=settings.off_timeout),
+        headers={"User-Agent": OFF_USER_AGENT},
+        raise_for_status=True,
+    )
+
+
+async def shutdown() -> None:
+    """Close the shared OFF HTTP session and release pooled connections."""
+    global _session
+    if _session is not None:
+        await _session.close()
+    _session = None
+
+
+async def _get_session() -> aiohttp.ClientSession:
+    # Lazily start the pool if we are used outside the app lifespan (scripts, REPL).
+    if _session is None or _session.closed:
+        await startup()
+    return _session
+
+
+async def _get_json(
+    operation: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    circuit: resilience.CircuitBreaker = breaker,
+    hedge: bool = False,
+) -> Dict[str, Any]:
+    """
+    GET an OFF endpoint through `circuit`, within the request's deadline.
+    With `hedge`, a second request is sent if the first is slow: only for
+    cheap reads, since a hedged search doubles the load on a struggling OFF.
+    """
+    circuit.check()
+    session = await _get_session()
+
+    async def attempt() -> Dict[str, Any]:
+        with metrics.track("off", operation):
+            async with session.get(url, params=params) as response:
+                # OFF sometimes answers with text/html content type for valid JSON
+                return await response.json(content_type=None)
+
+    if hedge and settings.off_hedge_delay > 0:
+        call = resilience.hedged(
+            attempt, settings.off_hedge_delay, on_hedge=metrics.HEDGED_REQUESTS.labels("off").inc
+        )
+    else:
+        call = attempt()
+
+    timeout = resilience.timeout_for(settings.off_timeout)
+    try:
+        data = await asyncio.wait_for(call, timeout)
+    except asyncio.TimeoutError:
+        # Only a full-length timeout says OFF is slow; a shortened one means our budget ran out
+        if timeout >= settings.off_timeout:
+            circuit.record_failure()
+        raise
+    except aiohttp.ClientResponseError as e:
+        # A 4xx is about our request, not OFF's health (except rate limiting)
+        if e.status >= 500 or e.status == 429:
+            circuit.record_failure()
+        raise
+    except Exception:
+        circuit.record_failure()
+        raise
+    circuit.record_success()
+    return data
+
+
+async def search_products(query: str, limit: int = 10, stop_early: bool = False) -> List[ProductBase]:
     """
     Rule-based search:
-    1. Try exact query. If results found -> Return immediately.
+    1. Try exact query. If results found -> Rank them (with any local index matches) and return.
     2. If empty -> Split query, pick top 3 longest words.
-    3. Search those 3 words individually and combine results.
+    3. Search those 3 words concurrently and combine results as they arrive.
+
+    The fallback is bounded by `settings.off_fallback_deadline`. With
+    `stop_early=True` it returns as soon as `limit` unique products are in hand
+    and cancels the searches that are still running.
+
+    When a local OFF store is configured it is searched first; the network
+    rules above only run if it has no match. Before going to the network we
+    also try the in-memory fuzzy `search_index`, which tolerates typos.
     """
-    
+
+    store = off_store.get_store()
+    if store is not None:
+        local = await asyncio.to_thread(store.search, query, limit)
+        if local:
+            return [_to_product_base(item) for item in local]
+
+    # --- RULE 0: Known products ---
+    # Only trust the local index when enough products match every query word
+    hits = [product for _, coverage, product in search_index.search(query, limit) if coverage == 1.0]
+    if len(hits) >= min(limit, settings.search_index_min_hits):
+        return hits
+
     # --- RULE 1: Exact Query Search ---
     # Try to find the exact match first.
-    products = _execute_off_search(query, page_size=limit)
-    
+    products = await _execute_off_search(query, page_size=limit)
+
     # If we got even 1 result, return it immediately and STOP.
     if products:
-        return products
+        search_index.add_many(products)
+        # OFF orders by popularity, not by the query: rank its results together with the index's matches
+        exact_ids = {p.id for p in products}
+        merged = products + [hit for hit in hits if hit.id not in exact_ids]
+        return search_index.rank(query, merged)[:limit]
 
     # --- RULE 2: Fallback (Longest Words) ---
     # If we are here, the exact search failed (returned []).
     words = query.split()
-    
+
     # Only proceed if we have multiple words (e.g., "Amul Butter")
     if len(words) > 1:
         # Sort words by length (descending) and take the top 3
         # Ex: "Amul Butter Pack" -> ["Butter", "Pack", "Amul"] (depending on length ties)
         longest_words = sorted(words, key=len, reverse=True)[:3]
-        
+
         fallback_results = []
         seen_ids: Set[str] = set()
-        
-        for word in longest_words:
-            # Search for this specific word
-            word_results = _execute_off_search(word, page_size=limit)
-            
-            # Append results, ensuring no duplicates
-            for p in word_results:
-                if p.id not in seen_ids:
-                    fallback_results.append(p)
-                    seen_ids.add(p.id)
-        
-        return fallback_results
+
+        # Fire all word searches at once; a miss now costs ~one round trip, not three
+        tasks = [
+            asyncio.create_task(_execute_off_search(word, page_size=limit))
+            for word in longest_words
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=settings.off_fallback_deadline):
+                try:
+                    word_results = await next_done
+                except TimeoutError:
+                    logger.warning(f"OFF fallback search for '{query}' hit the deadline")
+                    break
+
+                # Append results, ensuring no duplicates
+                for p in word_results:
+                    if p.id not in seen_ids:
+                        fallback_results.append(p)
+                        seen_ids.add(p.id)
+
+                if stop_early and len(fallback_results) >= limit:
+                    break
+        finally:
+            # Anything still running is no longer needed
+            for task in tasks:
+                task.cancel()
+
+        search_index.add_many(fallback_results)
+        # Single-word results arrive in whatever order; rank them against the full query
+        fallback_results = search_index.rank(query, fallback_results)
+        return fallback_results[:limit] if stop_early else fallback_results
 
     # If single word query failed, return nothing
     return []
 
-def _execute_off_search(search_term: str, page_size: int) -> List[ProductBase]:
+def _to_product_base(item: Dict[str, Any]) -> ProductBase:
+    return ProductBase(
+        product_name=item.get('product_name') or 'Unknown Product',
+        brand=item.get('brands', 'Unknown Brand'),
+        image_url=item.get('image_front_small_url', ''),
+        id=item.get('code')
+    )
+
+async def _execute_off_search(search_term: str, page_size: int) -> List[ProductBase]:
     """Helper function to execute the raw API request"""
     params = {
         "search_terms": search_term,
         "search_simple": 1,
         "action": "process",
         "json": 1,
-        "page_size": page_size
+        "page_size": page_size,
+        "fields": SEARCH_FIELDS,
     }
     try:
-        # Timeout set to 5s to keep the UI snappy even if we do multiple calls
-        response = requests.get(OFF_SEARCH_URL, params=params, timeout=10) 
-        response.raise_for_status()
-        data = response.json()
-        
-        products = []
-        for item in data.get('products', []):
-            products.append(ProductBase(
-                product_name=item.get('product_name', 'Unknown Product'),
-                brand=item.get('brands', 'Unknown Brand'),
-                image_url=item.get('image_front_small_url', ''),
-                id=item.get('code')
-            ))
-        return products
+        data = await _get_json("search", OFF_SEARCH_URL, params=params, circuit=search_breaker)
+
+        return [_to_product_base(item) for item in data.get('products', [])]
     except Exception as e:
-        print(f"Warning: OFF Search failed for term '{search_term}': {e}")
+        logger.warning(f"OFF search failed for term '{search_term}': {e}")
         return []
 
-def get_product_details(barcode: str) -> ProductDetail:
-    url = f"{OFF_PRODUCT_URL}{barcode}.json"
+async def _fetch_from_off(key: str) -> Optional[Dict[str, Any]]:
+    data = await _get_json("product", OFF_barcode_url.format(barcode=key), params={"fields": PRODUCT_FIELDS}, hedge=True)
+
+    # status == 1 means product found
+    product = data.get("product") if data.get("status") == 1 else None
+    if product is not None:
+        # Same shape as the local store: per-100g nutriments only, empty fields dropped
+        product = off_store.compact({**product, "code": key})
+        search_index.add(_to_product_base(product))
+    product_cache.set(key, product)
+    return product
+
+async def refresh_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """Fetch a product from OFF even if it is cached, and cache the result."""
+    key = str(barcode).strip()
+    return await _product_flights.do(key, lambda: _fetch_from_off(key))
+
+async def _fetch_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the raw OFF product dict for a barcode, or None if OFF does not know it.
+    Served from `product_cache` or the local OFF store when possible; an expired
+    product is returned as is while a fresh copy is fetched in the background.
+    Network errors are raised, not cached.
+    """
+    key = str(barcode).strip()
+    cached = product_cache.get(key)
+    if cached is not MISS:
+        return cached
+
+    store = off_store.get_store()
+    if store is not None:
+        product = await asyncio.to_thread(store.get, key)
+        if product is not None:
+            product_cache.set(key, product)
+            search_index.add(_to_product_base(product))
+            return product
+
+    stale = product_cache.get_stale(key, after_miss=True)
+    if stale not in (MISS, None):
+        refresher.revalidate(f"off_product:{key}", lambda: refresh_product(key))
+        return stale
+
+    return await refresh_product(key)
+
+async def get_product_details(barcode: str) -> ProductDetail:
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('status') == 1:
-            product = data.get('product', {})
+        product = await _fetch_product(barcode)
+
+        if product is not None:
             return ProductDetail(
-                product_name=product.get('product_name', 'Unknown Product'),
+                product_name=product.get('product_name') or 'Unknown Product',
                 brand=product.get('brands', 'Unknown Brand'),
                 image_url=product.get('image_front_url'),
                 id=barcode,
                 ingredients_text=product.get('ingredients_text'),
                 nutriments=product.get('nutriments')
             )
+    except resilience.CircuitOpen:
+        raise
     except Exception as e:
-        print(f"Error fetching product details: {e}")
+        logger.exception(f"Error fetching product details: {e}")
     return None
 
-def barcode_search(code):
+async def barcode_search(code):
     """
     Search for a product in Open Food Facts by barcode.
 
     :param code: str or int - product barcode (EAN/UPC)
-    :return: dict with product data if found, otherwise None
+    :return: dict with the PRODUCT_FIELDS of the product if found, otherwise None
     """
-    url = OFF_barcode_url.format(barcode=code)
-
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Request error: {e}")
+        return await _fetch_product(code)
+    except (aiohttp.ClientError, TimeoutError) as e:
+        logger.warning(f"OFF request error: {e}")
         return None
-
-    data = response.json()
-
-    # status == 1 means product found
-    if data.get("status") == 1:
-        return data.get("product")
-
-    # Product not found
-    return None
\ No newline at end of file
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import get_settings
+from app.services import admission
+from app.services.cache import TieredCache, MISS
+
+try:
+    import fcntl
+except ImportError:  # Windows: every process refreshes
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Every background refetch (scheduled pre-warming and stale-read revalidation) spends from this budget
+budget = admission.AdmissionController(
+    "refresher",
+    max_concurrency=settings.refresh_concurrency,
+    rate=settings.refresh_rate_limit,
+    burst=1,
+    max_queue=max(100, 2 * settings.refresh_top_n),
+    processes=settings.web_concurrency,
+)
+
+# Decayed request count per barcode: code -> (score, as of `time.time()`)
+_popularity: Dict[str, Tuple[float, float]] = {}
+MAX_TRACKED = 10000
+
+# Popularity survives restarts and is merged across workers, so startup can pre-warm the top barcodes
+popularity_store = TieredCache(
+    "popularity",
+    max_entries=0,
+    ttl=30 * 24 * 3600,
+    db_path=settings.cache_db_path or None,
+)
+_SNAPSHOT_KEY = "top"
+
+_revalidating: Dict[str, asyncio.Task] = {}
+_task: Optional[asyncio.Task] = None
+_lock_file = None
+_stats: Dict[str, Any] = {"leader": False, "passes": 0, "warmed": 0, "shed": 0, "failed": 0, "last_pass_at": None, "last_pass_ms": None}
+
+
+# --- Popularity ---
+
+def _decayed(score: float, at: float, now: float) -> float:
+    return score * 0.5 ** ((now - at) / settings.refresh_popularity_half_life)
+
+
+def record(code: str) -> None:
+    """Count one request for a barcode."""
+    code = str(code).strip()
+    if not code:
+        return
+    now = time.time()
+    score, at = _popularity.get(code, (0.0, now))
+    _popularity[code] = (_decayed(score, at, now) + 1.0, now)
+    if len(_popularity) > MAX_TRACKED:
+        # Forget the long tail in one go rather than on every request
+        for stale_code in top(len(_popularity))[MAX_TRACKED // 2:]:
+            del _popularity[stale_code]
+
+
+def top(n: int) -> List[str]:
+    """The `n` most requested barcodes, by decayed request count."""
+    now = time.time()
+    ranked = sorted(_popularity.items(), key=lambda item: -_decayed(*item[1], now))
+    return [code for code, _ in ranked[:n]]
+
+
+def _merge(entries: Dict[str, Any]) -> None:
+    now = time.time()
+    for code, (score, at) in entries.items():
+        current = _popularity.get(code)
+        if current is None or _decayed(*current, now) < _decayed(score, at, now):
+            _popularity[code] = (score, at)
+
+
+def _save() -> None:
+    """Merge this worker's counts into the shared snapshot (top barcodes only)."""
+    stored = popularity_store.get(_SNAPSHOT_KEY)
+    if stored not in (MISS, None):
+        _merge(stored)
+    keep = max(100, 2 * settings.refresh_top_n)
+    popularity_store.set(_SNAPSHOT_KEY, {code: list(_popularity[code]) for code in top(keep)})
+
+
+def _load() -> None:
+    stored = popularity_store.get(_SNAPSHOT_KEY)
+    if stored not in (MISS, None):
+        _merge(stored)
+
+
+# --- Background refetches ---
+
+def revalidate(key: str, refetch: Callable[[], Awaitable[Any]]) -> None:
+    """
+    Run `refetch()` in the background, at background priority and within the
+    refresher's budget, unless a refetch for `key` is already on its way.
+    Used after answering a request with a stale cache entry.
+    """
+    if key in _revalidating:
+        return
+
+    async def run():
+        try:
+            async with budget.slot(admission.BACKGROUND, max_wait=settings.refresh_interval):
+                await refetch()
+        except admission.Shed:
+            # Over budget; the next stale read asks again
+            _stats["shed"] += 1
+        except Exception as e:
+            _stats["failed"] += 1
+            logger.warning(f"Revalidating {key} failed: {e}")
+        finally:
+            _revalidating.pop(key, None)
+
+    # The task copies the context, so upstream calls it makes (e.g. watsonx admission) see the priority too
+    with admission.priority(admission.BACKGROUND):
+        _revalidating[key] = asyncio.ensure_future(run())
+
+
+def _needs_refresh(cache: TieredCache, key: str) -> bool:
+    value, expires_at = cache.peek(key)
+    return value is MISS or expires_at <= time.time()
+
+
+async def _warm(code: str) -> bool:
+    """Refetch the product and its analysis if either is missing or expired. True if anything was fetched."""
+    # Imported here: both services import this module for `revalidate`
+    from app.services import openfoodfacts_service, watson_ai_service
+
+    warmed = False
+    if _needs_refresh(openfoodfacts_service.product_cache, code):
+        async with budget.slot(admission.BACKGROUND, max_wait=settings.refresh_interval):
+            await openfoodfacts_service.refresh_product(code)
+        warmed = True
+
+    if not watson_ai_service.is_configured():
+        return warmed
+    product = await openfoodfacts_service.get_product_details(code)
+    if not product or not product.ingredients_text:
+        return warmed
+    # Same key as a default (full mode) analysis request for this product
+    key = watson_ai_service.analysis_key(product.ingredients_text, product.product_name)
+    if _needs_refresh(watson_ai_service.analysis_cache, key):
+        async with budget.slot(admission.BACKGROUND, max_wait=settings.refresh_interval):
+            await watson_ai_service.refresh_analysis(product.ingredients_text, product.product_name)
+        warmed = True
+    return warmed
+
+
+async def run_pass() -> None:
+    """Warm the `refresh_top_n` most requested barcodes once."""
+    started = time.perf_counter()
+    codes = top(settings.refresh_top_n)
+    results = await asyncio.gather(*(_warm(code) for code in codes), return_exceptions=True)
+    for code, result in zip(codes, results):
+        if result is True:
+            _stats["warmed"] += 1
+        elif isinstance(result, admission.Shed):
+            _stats["shed"] += 1
+        elif isinstance(result, Exception):
+            _stats["failed"] += 1
+            logger.warning(f"Pre-warming {code} failed: {result}")
+    _stats["passes"] += 1
+    _stats["last_pass_at"] = time.time()
+    _stats["last_pass_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def _is_leader() -> bool:
+    """
+    Only one worker process runs the scheduled passes (they share the cache, so
+    one is enough): whoever holds an exclusive lock next to the cache database.
+    The lock is released when that worker exits, and another one takes over.
+    """
+    global _lock_file
+    if _lock_file is not None or fcntl is None or not settings.cache_db_path:
+        return True
+    try:
+        lock_file = open(f"{settings.cache_db_path}.refresher.lock", "a")
+    except OSError:
+        return True
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file
+    return True
+
+
+async def _loop() -> None:
+    # First pass right away: pre-warm after a deploy or restart
+    while True:
+        _load()
+        _stats["leader"] = _is_leader()
+        if _stats["leader"]:
+            try:
+                await run_pass()
+            except Exception as e:
+                logger.exception(f"Refresher pass failed: {e}")
+        _save()
+        await asyncio.sleep(settings.refresh_interval)
+
+
+async def start() -> None:
+    """Start the scheduled pre-warming. No-op when `refresh_top_n` is 0."""
+    global _task
+    if settings.refresh_top_n <= 0 or _task is not None:
+        return
+    _task = asyncio.create_task(_loop())
+
+
+async def stop() -> None:
+    global _task
+    tasks = [t for t in (_task, *_revalidating.values()) if t is not None]
+    _task = None
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _save()
+
+
+def stats() -> Dict[str, Any]:
+    now = time.time()
+    return {
+        **_stats,
+        "tracked": len(_popularity),
+        "top": [{"code": code, "score": round(_decayed(*_popularity[code], now), 2)} for code in top(10)],
+        "revalidating": len(_revalidating),
+        "budget": budget.stats(),
+    }
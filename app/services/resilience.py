@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_registry: Dict[str, "CircuitBreaker"] = {}
+
+# Absolute `time.monotonic()` by which the current request must be answered
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# --- Deadlines ---
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Bound everything inside the block to `seconds` from now. Nested scopes can
+    only tighten the outer deadline, so a stage never borrows time from the
+    stages after it. `seconds <= 0` leaves the current deadline unchanged.
+    """
+    current = _deadline.get()
+    if seconds > 0:
+        proposed = time.monotonic() + seconds
+        current = proposed if current is None else min(current, proposed)
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current deadline, or None when there is none."""
+    current = _deadline.get()
+    return None if current is None else max(0.0, current - time.monotonic())
+
+
+def timeout_for(cap: float) -> float:
+    """Timeout for one upstream call: its own cap, or less if the request's budget is nearly spent."""
+    left = remaining()
+    return cap if left is None else min(cap, left)
+
+
+# --- Circuit breaker ---
+
+class CircuitBreaker:
+    """
+    Fails fast while an upstream is unhealthy.
+
+    Opens after `failure_threshold` consecutive failures. While open, `allow()`
+    is False until `recovery_timeout` has passed; then one probe call is let
+    through (half-open). Its success closes the breaker, its failure re-opens
+    it. A probe that never reports back frees the slot after another
+    `recovery_timeout`. Thread-safe.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._changed_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+        _registry[name] = self
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._changed_at >= self.recovery_timeout:
+                # Let one probe through; others keep failing fast until it reports back
+                self.state = self.HALF_OPEN
+                self._changed_at = now
+                return True
+            self.rejected += 1
+            return False
+
+    def check(self) -> None:
+        """`allow()` that raises `CircuitOpen` instead of returning False."""
+        if not self.allow():
+            raise CircuitOpen(self.name, self.retry_after())
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self._changed_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self.state != self.CLOSED:
+                self.state = self.CLOSED
+                self._changed_at = time.monotonic()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._changed_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "rejected": self.rejected,
+                "opened": self.opened,
+            }
+
+
+def all_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every circuit breaker in this process, keyed by name."""
+    return {name: breaker.stats() for name, breaker in _registry.items()}
+
+
+# --- Hedging ---
+
+async def hedged(
+    call: Callable[[], Awaitable[Any]],
+    delay: float,
+    attempts: int = 2,
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> Any:
+    """
+    Run `call()`; if it has not finished after `delay` seconds (or fails first),
+    start another copy, up to `attempts` in total. The first success wins and
+    the rest are cancelled. Only for idempotent reads.
+    """
+    tasks = {asyncio.ensure_future(call())}
+    launched = 1
+    last_error: Optional[BaseException] = None
+    try:
+        while True:
+            wait = delay if launched < attempts else None
+            done, tasks = await asyncio.wait(tasks, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                last_error = task.exception()
+            if launched < attempts and (not done or not tasks):
+                # Slow (no result within `delay`) or everything in flight already failed
+                tasks.add(asyncio.ensure_future(call()))
+                launched += 1
+                if on_hedge is not None:
+                    on_hedge()
+            elif not tasks:
+                raise last_error
+    finally:
+        for task in tasks:
+            task.cancel()
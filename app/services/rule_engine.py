@@ -0,0 +1,300 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.config import get_settings
+from app.models.analysis_models import AlertDetail, AnalysisResult, HealthRisk, MarketingTrap
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "ingredient_rules.json")
+
+# How often (seconds) `get_engine` looks at the rules file's mtime
+RELOAD_CHECK_INTERVAL = 5.0
+
+# "E 211", "E-211", "INS 471", "ins471", "E150d", "INS 322(i)" -> "e211", "e471", "e150d", "e322"
+_CODE_PREFIXED = re.compile(r"\b(?:e|ins)\s*[-.]?\s*(\d{3,4})([a-f])?(?:\s*\(\s*[ivx]+\s*\))?(?![\d])")
+# Bare codes listed in brackets after a class name: "emulsifier (471, 322)"
+_CODE_BRACKETED = re.compile(r"\(\s*(\d{3,4}[a-f]?(?:\s*\(\s*[ivx]+\s*\))?(?:\s*[,&/]\s*\d{3,4}[a-f]?(?:\s*\(\s*[ivx]+\s*\))?)*)\s*\)")
+_BARE_CODE = re.compile(r"(\d{3,4})([a-f])?(?:\s*\(\s*[ivx]+\s*\))?")
+
+
+class AhoCorasick:
+    """
+    Minimal Aho-Corasick automaton over characters. `find` reports every
+    occurrence of every pattern in a single pass over the text.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, Any]]] = [[]]  # (pattern length, value)
+
+    def add(self, pattern: str, value: Any) -> None:
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), value))
+
+    def build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """Yield (start, end, value) for every match."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                yield i - length + 1, i + 1, value
+
+
+def normalize_label_text(text: str) -> str:
+    """Lower-case, fold whitespace and rewrite E-number/INS references to canonical `e<code>` tokens."""
+    text = " ".join((text or "").lower().split())
+
+    def bracketed(match: re.Match) -> str:
+        codes = ", ".join(f"e{m.group(1)}{m.group(2) or ''}" for m in _BARE_CODE.finditer(match.group(1)))
+        return f"({codes})"
+
+    text = _CODE_PREFIXED.sub(lambda m: f"e{m.group(1)}{m.group(2) or ''}", text)
+    return _CODE_BRACKETED.sub(bracketed, text)
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum()
+
+
+class RuleEngine:
+    """
+    Compiled keyword index over additives, hidden sugars, refined-flour aliases
+    and marketing-claim phrases. `detect` fills the structured parts of
+    `AnalysisResult` without calling the LLM.
+    """
+
+    def __init__(self, rules: Dict[str, Any], source: str = "", mtime: float = 0.0):
+        self.source = source
+        self.mtime = mtime
+        self.additives: Dict[str, Dict[str, Any]] = rules.get("additives", {})
+
+        self._ingredients = AhoCorasick()
+        for code, info in self.additives.items():
+            self._ingredients.add(code.lower(), ("additive", code))
+            for alias in info.get("aliases", []):
+                self._ingredients.add(alias.lower(), ("additive", code))
+        for canonical, aliases in rules.get("hidden_sugars", {}).items():
+            for alias in aliases:
+                self._ingredients.add(alias.lower(), ("sugar", canonical))
+        for alias in rules.get("refined_flour", []):
+            self._ingredients.add(alias.lower(), ("flour", alias))
+        self._ingredients.build()
+
+        self._claims = AhoCorasick()
+        for claim, phrases in rules.get("claims", {}).items():
+            for phrase in phrases:
+                self._claims.add(phrase.lower(), (claim, phrase))
+        self._claims.build()
+
+    @classmethod
+    def from_file(cls, path: str) -> "RuleEngine":
+        with open(path, encoding="utf-8") as f:
+            rules = json.load(f)
+        return cls(rules, source=path, mtime=os.path.getmtime(path))
+
+    @staticmethod
+    def _matches(automaton: AhoCorasick, text: str) -> List[Tuple[int, int, Any]]:
+        # Whole-word matches only, leftmost-longest, no overlaps ("high fructose corn syrup" is not also "fructose")
+        found = [
+            (start, end, value)
+            for start, end, value in automaton.find(text)
+            if (start == 0 or not _is_word_char(text[start - 1]))
+            and (end == len(text) or not _is_word_char(text[end]))
+        ]
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected = []
+        last_end = -1
+        for match in found:
+            if match[0] >= last_end:
+                selected.append(match)
+                last_end = match[1]
+        return selected
+
+    def detect(self, ingredients: str, product_name: Optional[str] = "") -> AnalysisResult:
+        text = normalize_label_text(ingredients)
+
+        additives: List[str] = []
+        sugars: List[str] = []
+        flours: List[str] = []
+        for _, _, (kind, key) in self._matches(self._ingredients, text):
+            bucket = {"additive": additives, "sugar": sugars, "flour": flours}[kind]
+            if key not in bucket:
+                bucket.append(key)
+
+        claims: Dict[str, str] = {}
+        for _, _, (claim, phrase) in self._matches(self._claims, normalize_label_text(product_name or "")):
+            claims.setdefault(claim, phrase)
+
+        harmful_additives = [f"{self.additives[code]['name']} ({code})" for code in additives]
+        health_risks = [
+            HealthRisk(
+                ingredient=f"{self.additives[code]['name']} ({code})",
+                risk=self.additives[code].get("risk", ""),
+                health_impact=self.additives[code].get("health_impact", ""),
+                regulatory_status=self.additives[code].get("regulatory_status", ""),
+            )
+            for code in additives
+        ]
+
+        traps: List[MarketingTrap] = []
+        maida_trap = bool(flours) and "whole_grain" in claims
+        if maida_trap:
+            traps.append(MarketingTrap(
+                claim=f"Name suggests '{claims['whole_grain']}'",
+                reality=f"Contains refined flour ({', '.join(flours)})",
+            ))
+        if sugars and "no_sugar" in claims:
+            traps.append(MarketingTrap(
+                claim=f"Name says '{claims['no_sugar']}'",
+                reality=f"Contains sugars under other names ({', '.join(sugars)})",
+            ))
+        if (additives or sugars) and "natural" in claims:
+            traps.append(MarketingTrap(
+                claim=f"Name suggests '{claims['natural']}'",
+                reality="Contains processed sweeteners or additives",
+            ))
+
+        alerts = {
+            "maida_trap": AlertDetail(
+                detected=maida_trap,
+                explanation=f"Refined flour found: {', '.join(flours)}" if flours else "",
+            ),
+            "hidden_sugars": AlertDetail(
+                detected=bool(sugars),
+                explanation=", ".join(sugars),
+            ),
+            "harmful_additives": AlertDetail(
+                detected=bool(additives),
+                explanation=", ".join(harmful_additives),
+            ),
+            "fake_marketing": AlertDetail(
+                detected=bool(traps),
+                explanation="; ".join(t.reality for t in traps),
+            ),
+        }
+
+        concerns = len(additives) + (1 if sugars else 0) + (1 if flours else 0) + len(traps)
+        if concerns == 0:
+            verdict = "Generally Safe"
+        elif concerns <= 2:
+            verdict = "Consume With Caution"
+        else:
+            verdict = "Avoid Frequent Consumption"
+
+        return AnalysisResult(
+            product_name=product_name or "",
+            overall_verdict=verdict,
+            summary=(
+                f"Rule-based check found {len(additives)} additive(s) of concern, "
+                f"{len(sugars)} hidden sugar(s) and {'refined flour' if flours else 'no refined flour'}."
+            ),
+            health_risks=health_risks,
+            hidden_sugars=sugars,
+            harmful_additives=harmful_additives,
+            marketing_traps=traps,
+            alerts=alerts,
+        )
+
+
+def render_findings(result: AnalysisResult) -> str:
+    """KEY RISKS and MARKETING TRAPS sections, in the same plain-text layout as the LLM analysis."""
+    lines = ["KEY RISKS"]
+    if result.health_risks or result.hidden_sugars:
+        lines += [f"{r.ingredient}: {r.health_impact}" for r in result.health_risks]
+        if result.hidden_sugars:
+            lines.append(f"Hidden sugars: {', '.join(result.hidden_sugars)}")
+    else:
+        lines.append("None detected by the rule check")
+    if result.alerts.get("maida_trap") and result.alerts["maida_trap"].explanation:
+        lines.append(result.alerts["maida_trap"].explanation)
+    lines += ["", "MARKETING TRAPS"]
+    lines += [f"{t.claim}, but {t.reality[0].lower()}{t.reality[1:]}" for t in result.marketing_traps] or ["None detected"]
+    return "\n".join(lines)
+
+
+def render_text(result: AnalysisResult) -> str:
+    """Full plain-text analysis built from rule-engine output alone."""
+    return "\n".join([
+        "OVERALL VERDICT", result.overall_verdict, "",
+        "SUMMARY", result.summary, "",
+        render_findings(result),
+    ])
+
+
+_engine: Optional[RuleEngine] = None
+_engine_lock = threading.Lock()
+_last_check = 0.0
+
+
+def _rules_path() -> str:
+    return settings.rules_path or DEFAULT_RULES_PATH
+
+
+def reload() -> RuleEngine:
+    """Rebuild the engine from the rules file. The old engine keeps serving if the file is invalid."""
+    global _engine
+    path = _rules_path()
+    try:
+        engine = RuleEngine.from_file(path)
+    except (OSError, ValueError) as e:
+        if _engine is None:
+            raise
+        logger.error(f"Ingredient rules reload from {path} failed, keeping previous rules: {e}")
+        return _engine
+    _engine = engine
+    return engine
+
+
+def get_engine() -> RuleEngine:
+    """Current engine; picks up edits to the rules file without a restart."""
+    global _last_check
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _last_check = time.monotonic()
+                return reload()
+    now = time.monotonic()
+    if now - _last_check >= RELOAD_CHECK_INTERVAL:
+        _last_check = now
+        try:
+            if os.path.getmtime(_rules_path()) != _engine.mtime:
+                return reload()
+        except OSError:
+            pass
+    return _engine
+
+
+def detect(ingredients: str, product_name: Optional[str] = "") -> AnalysisResult:
+    return get_engine().detect(ingredients, product_name)
@@ -0,0 +1,190 @@
+import heapq
+import math
+import re
+from collections import Counter, OrderedDict, defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+from app.models.product_models import ProductBase
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query_token: str, token: str) -> float:
+    """Edit-distance style similarity in [0, 1]; typing the start of a word counts as a strong match."""
+    if query_token == token:
+        return 1.0
+    score = SequenceMatcher(None, query_token, token).ratio()
+    if len(query_token) >= 3 and token.startswith(query_token):
+        score = max(score, 0.9)
+    return score
+
+
+class ProductSearchIndex:
+    """
+    In-memory fuzzy index over products we have already seen (search results and
+    product lookups).
+
+    Query words are expanded to indexed words that share trigrams with them,
+    scored by edit similarity, and documents are ranked with BM25 weighted by
+    that similarity. "amul buter" therefore finds "Amul Butter" without asking
+    Open Food Facts again. The index keeps at most `max_docs` products and
+    forgets the least recently added ones first.
+    """
+
+    def __init__(self, max_docs: int = 50000, min_similarity: float = 0.75):
+        self.max_docs = max_docs
+        self.min_similarity = min_similarity
+        self._docs: "OrderedDict[str, Tuple[ProductBase, Counter, int]]" = OrderedDict()  # id -> (product, tf, length)
+        self._postings: Dict[str, Set[str]] = defaultdict(set)  # token -> doc ids
+        self._grams: Dict[str, Set[str]] = defaultdict(set)  # trigram -> tokens
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    # --- Maintenance ---
+
+    def add(self, product: ProductBase) -> None:
+        if not product.id:
+            return
+        self.remove(product.id)
+        tokens = tokenize(product.product_name) + tokenize(product.brand)
+        tf = Counter(tokens)
+        self._docs[product.id] = (product, tf, len(tokens))
+        self._total_len += len(tokens)
+        for token in tf:
+            if token not in self._postings:
+                for gram in trigrams(token):
+                    self._grams[gram].add(token)
+            self._postings[token].add(product.id)
+        while len(self._docs) > self.max_docs:
+            self.remove(next(iter(self._docs)))
+
+    def add_many(self, products: List[ProductBase]) -> None:
+        for product in products:
+            self.add(product)
+
+    def remove(self, doc_id: str) -> None:
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        _, tf, length = entry
+        self._total_len -= length
+        for token in tf:
+            docs = self._postings.get(token)
+            if docs is None:
+                continue
+            docs.discard(doc_id)
+            if not docs:
+                del self._postings[token]
+                for gram in trigrams(token):
+                    bucket = self._grams.get(gram)
+                    if bucket is not None:
+                        bucket.discard(token)
+                        if not bucket:
+                            del self._grams[gram]
+
+    # --- Scoring ---
+
+    def _idf(self, token: str) -> float:
+        n = len(self._docs)
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _expand(self, query_token: str) -> Dict[str, float]:
+        """Indexed tokens that plausibly mean `query_token`, with their similarity."""
+        query_grams = trigrams(query_token)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for token in self._grams.get(gram, ()):
+                shared[token] += 1
+        needed = max(1, len(query_grams) // 3)
+        matches = {}
+        for token, count in shared.items():
+            if count < needed:
+                continue
+            score = similarity(query_token, token)
+            if score >= self.min_similarity:
+                matches[token] = score
+        return matches
+
+    def _avg_len(self) -> float:
+        return (self._total_len / len(self._docs) if self._docs else 0.0) or 1.0
+
+    @staticmethod
+    def _bm25(tf: int, doc_len: int, avg_len: float) -> float:
+        return tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len / avg_len))
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, float, ProductBase]]:
+        """
+        Return up to `limit` (score, coverage, product) tuples, best first.
+        `coverage` is the fraction of query words the product matched.
+        """
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens or not self._docs:
+            return []
+
+        avg_len = self._avg_len()
+        docs = self._docs
+        scores: Dict[str, float] = defaultdict(float)
+        matched: Dict[str, int] = defaultdict(int)
+        for query_token in query_tokens:
+            best: Dict[str, float] = {}
+            for token, sim in self._expand(query_token).items():
+                weight = sim * self._idf(token)
+                for doc_id in self._postings[token]:
+                    _, tf, length = docs[doc_id]
+                    value = weight * self._bm25(tf[token], length, avg_len)
+                    if value > best.get(doc_id, 0.0):
+                        best[doc_id] = value
+            for doc_id, value in best.items():
+                scores[doc_id] += value
+                matched[doc_id] += 1
+
+        ranked = heapq.nlargest(
+            limit,
+            (
+                (score * matched[doc_id] / len(query_tokens), matched[doc_id] / len(query_tokens), doc_id)
+                for doc_id, score in scores.items()
+            ),
+            key=lambda item: item[0],
+        )
+        return [(score, coverage, docs[doc_id][0]) for score, coverage, doc_id in ranked]
+
+    def rank(self, query: str, products: List[ProductBase]) -> List[ProductBase]:
+        """Order an arbitrary result list by relevance to `query` (stable for ties)."""
+        query_tokens = list(dict.fromkeys(tokenize(query)))
+        if not query_tokens:
+            return products
+
+        avg_len = self._avg_len()
+
+        def score(product: ProductBase) -> float:
+            tokens = tokenize(product.product_name) + tokenize(product.brand)
+            if not tokens:
+                return 0.0
+            tf = Counter(tokens)
+            total = 0.0
+            for query_token in query_tokens:
+                best = 0.0
+                for token, count in tf.items():
+                    sim = similarity(query_token, token)
+                    if sim >= self.min_similarity:
+                        best = max(best, sim * self._idf(token) * self._bm25(count, len(tokens), avg_len))
+                total += best
+            return total
+
+        return sorted(products, key=score, reverse=True)
@@ -0,0 +1,98 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class Trace:
+    """
+    Spans recorded while serving one request. Thread-safe, so work handed to
+    an executor (watsonx, OCR) can add spans to the request that started it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[Tuple[str, float, float]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float) -> None:
+        with self._lock:
+            self.spans.append((name, (start - self.started) * 1000, duration * 1000))
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def totals(self) -> Dict[str, float]:
+        """Milliseconds per span name; repeated or concurrent spans are summed."""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for name, _, duration in self.spans:
+                totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def server_timing(self) -> str:
+        """`Server-Timing` header value, readable in browser dev tools."""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.totals().items()]
+        parts.append(f"total;dur={self.elapsed_ms():.1f}")
+        return ", ".join(parts)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = [
+                {"name": name, "offset_ms": round(offset, 1), "duration_ms": round(duration, 1)}
+                for name, offset, duration in self.spans
+            ]
+        return {"name": self.name, "total_ms": round(self.elapsed_ms(), 1), "spans": spans}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+
+def start(name: str) -> contextvars.Token:
+    return _current.set(Trace(name))
+
+
+def finish(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[Trace]:
+    return _current.get()
+
+
+def set_request_id(value: str) -> contextvars.Token:
+    return _request_id.set(value)
+
+
+def reset_request_id(token: contextvars.Token) -> None:
+    _request_id.reset(token)
+
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+@contextmanager
+def span(name: str):
+    """Time a block as a span of the current trace; a no-op when the request is not traced."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, started, time.perf_counter() - started)
+
+
+def propagate(fn: Callable) -> Callable:
+    """
+    Bind `fn` to the caller's context. `run_in_executor` does not copy
+    contextvars, so wrap functions handed to an executor with this.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
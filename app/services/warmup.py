@@ -0,0 +1,47 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# name -> {"status": "warming" | "ready" | "failed" | "skipped", "ms": ..., "error": ...}
+_state: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _run(name: str, fn: Callable[[], None]) -> None:
+    started = time.perf_counter()
+    try:
+        fn()
+        entry = {"status": "ready"}
+    except Exception as e:
+        logger.warning(f"Warmup of {name} failed: {e}")
+        entry = {"status": "failed", "error": str(e)}
+    entry["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    with _lock:
+        _state[name] = entry
+
+
+def start(tasks: Dict[str, Optional[Callable[[], None]]]) -> None:
+    """
+    Run each warmup task (SDK imports, client construction, rule compilation) on
+    its own daemon thread so the server starts accepting requests immediately.
+    A `None` task is reported as skipped (e.g. no credentials configured).
+    """
+    for name, fn in tasks.items():
+        with _lock:
+            _state[name] = {"status": "warming" if fn else "skipped"}
+        if fn is not None:
+            threading.Thread(target=_run, args=(name, fn), name=f"warmup-{name}", daemon=True).start()
+
+
+def status() -> Dict[str, dict]:
+    with _lock:
+        return {name: dict(entry) for name, entry in _state.items()}
+
+
+def is_ready() -> bool:
+    """True once no warmup task is still running (failed ones degrade, they do not block)."""
+    with _lock:
+        return all(entry["status"] != "warming" for entry in _state.values())
@@ -1,84 +1,49 @@
 import os
 import json
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
 from app.config import get_settings
 from app.models.analysis_models import AnalysisResult
+from pydantic import TypeAdapter, ValidationError
+from app.services.cache import TieredCache, MISS
+from app.services.watsonx_pool import ModelPool
+from app.services.singleflight import SingleFlight
+from app.services import rule_engine, metrics, resilience, tracing, ingredient_memo, admission, refresher
+from app.services.json_stream import ObjectStreamParser
 import re
 import json
+import time
 import logging
 from typing import Optional
 
-logging.basicConfig(
-    filename='model_hostory.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
-
-# Import Watson SDKs
-try:
-    from ibm_watson_machine_learning.foundation_models import Model
-    from ibm_watson_machine_learning.metanames import GenTextParamsMetaNames as GenParams
-except ImportError:
-    print("Warning: ibm-watson-machine-learning not installed.")
-    Model = None
+# Full generated texts; sampled and written to their own rotating file (see app/logging_setup.py)
+model_output_logger = logging.getLogger("app.model_output")
 
 settings = get_settings()
 
-def clean_and_repair_json(text_output: str) -> Optional[dict]:
-    if not text_output:
-        return None
-
-    # 1. Clean whitespace and markdown
-    cleaned = text_output.strip()
-    cleaned = re.sub(r'^```(?:json)?\s*|```$', '', cleaned, flags=re.IGNORECASE).strip()
-    
-    # 2. HANDLE PRE-FILL CORRECTLY
-    # If it already starts with {, don't add another one.
-    # If it starts with " (a key), add the brace.
-    if not cleaned.startswith('{'):
-        cleaned = '{' + cleaned
-    
-    # 3. FIX LOG-SPECIFIC HALLUCINATIONS
-    cleaned = cleaned.replace('[-]', '[]')
-    # Fix the Iodine] issue seen in your logs
-    cleaned = cleaned.replace(']', '"]').replace('"]', '"]').replace(']]', ']')
-    
-    # 4. REMOVE DOUBLE BRACES (The most likely culprit for your current error)
-    while cleaned.startswith('{{'):
-        cleaned = cleaned[1:]
-    while cleaned.endswith('}}'):
-        cleaned = cleaned[:-1]
-
-    # 5. PARSE
-    try:
-        return json.loads(cleaned)
-    except json.JSONDecodeError:
-        # Final attempt: isolate strictly between first { and last }
-        try:
-            start = cleaned.find('{')
-            end = cleaned.rfind('}')
-            if start != -1 and end != -1:
-                return json.loads(cleaned[start:end+1])
-        except:
-            return None
-    return None
 
-
-def analyze_ingredients_with_watson(ingredients: str, product_name: str = "") -> AnalysisResult:
+@lru_cache()
+def _model_class():
     """
-    Analyzes the ingredients list using IBM watsonx.ai to identify health concerns.
+    The watsonx SDK's `Model`, imported on first real use: the SDK (pandas and
+    friends) takes seconds to import, which mock mode and cold starts should not pay.
     """
-    
-    if not settings.ibm_api_key or not settings.project_id:
-        # Fallback/Mock for testing without keys
-        return AnalysisResult(
-            summary="[MOCK] Analysis requires IBM Cloud credentials. Ingredients received: " + ingredients[:50] + "...",
-            harmful_additives=["Check credentials"],
-            recommendation="Configure .env with IBM keys to get real analysis."
-        )
+    try:
+        from ibm_watson_machine_learning.foundation_models import Model
+    except ImportError:
+        print("Warning: ibm-watson-machine-learning not installed.")
+        return None
+    return Model
 
-    # Simplified Prompt Engineering
-    prompt_input = (
+MODEL_ID = "ibm/granite-3-8b-instruct"
+
+# Simplified Prompt Engineering
+PROMPT_TEMPLATE = (
     """
     ROLE : You are a Senior Food Safety & Public Health Analyst specializing in FSSAI (India), EU, and US FDA standards.
 
@@ -116,49 +81,823 @@ def analyze_ingredients_with_watson(ingredients: str, product_name: str = "") ->
     
     RESPONSE:
     """
-    ).format(product_name=product_name, ingredients=ingredients)
+)
+
+# Shorter prompt used when the local rule engine has already found the risky ingredients
+ASSISTED_PROMPT_TEMPLATE = (
+    """
+    ROLE : You are a Senior Food Safety & Public Health Analyst specializing in FSSAI (India), EU, and US FDA standards.
+
+    A rule check has already listed the risky ingredients below. Do not repeat them one by one; build on them.
+    Plain text only. Do NOT use Markdown, asterisks (**), hashtags (#), or backticks (```).
+
+    SECTIONS: OVERALL VERDICT, SUMMARY, POSITIVE HIGHLIGHTS, RECOMMENDATION
+
+    RULE CHECK FINDINGS:
+    {findings}
+
+    Product: {product_name}
+    Ingredients: {ingredients}
+
+    RESPONSE:
+    """
+)
+ASSISTED_MAX_NEW_TOKENS = 300
+
+# Structured mode: same analysis as JSON matching `AnalysisResult`.
+# Keys are listed in the order clients want them first; the parser emits each as it completes.
+STRUCTURED_PROMPT_TEMPLATE = (
+    """
+    ROLE : You are a Senior Food Safety & Public Health Analyst specializing in FSSAI (India), EU, and US FDA standards.
+
+    TASK: Analyze the product ingredients below and return your health assessment as ONE JSON object.
+
+    CONSTRAINTS:
+    1. OUTPUT FORMAT: A single JSON object and nothing else. No Markdown, no code fences, no text before or after it.
+    2. Use exactly these keys, in this order, with these value types:
+    {{
+      "overall_verdict": "Healthy | Safe | Consume With Caution | Avoid",
+      "summary": "a concise paragraph on the health profile and any fake marketing",
+      "health_risks": [{{"ingredient": "", "risk": "Low | Medium | High", "health_impact": "", "regulatory_status": ""}}],
+      "harmful_additives": ["additive names"],
+      "hidden_sugars": ["sugar aliases found in the ingredients"],
+      "marketing_traps": [{{"claim": "", "reality": ""}}],
+      "alerts": {{"maida_trap": {{"detected": false, "explanation": ""}}, "fake_marketing": {{"detected": false, "explanation": ""}}}},
+      "positive_highlights": ["good nutritional aspects, if any"],
+      "population_warnings": {{"children": "", "pregnant_women": "", "diabetics": "", "allergy_risk": ""}},
+      "consumption_advice": "who should consume this and how often",
+      "recommendation": "one sentence"
+    }}
+
+    DATA TO ANALYZE:
+    Product: {product_name}
+    Ingredients: {ingredients}
+
+    RESPONSE:
+    """
+)
+STRUCTURED_MAX_NEW_TOKENS = 900
 
+# Incremental mode: each ingredient is assessed once and memoized (see app/services/ingredient_memo.py);
+# a product then only costs the ingredients not seen before plus a short compose step.
+INGREDIENT_PROMPT_TEMPLATE = (
+    """
+    ROLE : You are a Senior Food Safety & Public Health Analyst specializing in FSSAI (India), EU, and US FDA standards.
+
+    Assess each food ingredient below on its own, as commonly used in packaged foods.
+    Answer with exactly one line per ingredient, in the same order, in this format:
+    ingredient | Low, Medium or High concern | one short sentence on its health impact
+    Plain text only. No Markdown, no numbering, no other text.
+
+    INGREDIENTS:
+    {ingredients}
+
+    RESPONSE:
+    """
+)
+INGREDIENT_BATCH_SIZE = 15
+INGREDIENT_TOKENS_PER_ITEM = 40
+
+COMPOSE_PROMPT_TEMPLATE = (
+    """
+    ROLE : You are a Senior Food Safety & Public Health Analyst specializing in FSSAI (India), EU, and US FDA standards.
+
+    Each ingredient of this product has already been assessed (label order, largest quantity first).
+    Do not repeat them one by one; weigh them together for the product as a whole.
+    Plain text only. Do NOT use Markdown, asterisks (**), hashtags (#), or backticks (```).
+
+    SECTIONS: OVERALL VERDICT, SUMMARY, RECOMMENDATION, MARKETING TRAPS
+
+    Product: {product_name}
+    INGREDIENT ASSESSMENTS:
+    {assessments}
+
+    RESPONSE:
+    """
+)
+COMPOSE_MAX_NEW_TOKENS = 200
+
+# Any edit to the prompt changes this, so cached analyses from an older prompt are never served.
+PROMPT_VERSION = hashlib.sha256(PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+ASSISTED_PROMPT_VERSION = hashlib.sha256(ASSISTED_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+STRUCTURED_PROMPT_VERSION = hashlib.sha256(STRUCTURED_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+INGREDIENT_PROMPT_VERSION = hashlib.sha256(INGREDIENT_PROMPT_TEMPLATE.encode("utf-8")).hexdigest()[:12]
+INCREMENTAL_PROMPT_VERSION = hashlib.sha256(
+    (INGREDIENT_PROMPT_VERSION + COMPOSE_PROMPT_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+# Namespace of the memoized ingredient assessments
+INGREDIENT_MEMO_VERSION = f"{MODEL_ID}:{INGREDIENT_PROMPT_VERSION}"
+
+# Validators for single `AnalysisResult` fields, so partial results can be checked as they arrive
+_FIELD_ADAPTERS = {name: TypeAdapter(field.annotation) for name, field in AnalysisResult.model_fields.items()}
+
+# Finished analysis texts, content-addressed by `analysis_key`.
+analysis_cache = TieredCache(
+    "analysis",
+    max_entries=settings.analysis_cache_size,
+    ttl=settings.analysis_cache_ttl,
+    db_path=settings.cache_db_path or None,
+    stale_ttl=settings.analysis_cache_stale_ttl,
+)
+
+_analysis_flights = SingleFlight("analysis")
+
+ERROR_PREFIX = "Error:"
+
+# While watsonx is failing, analyses come from the local rule engine instead (see `_degraded_analysis`)
+breaker = resilience.CircuitBreaker(
+    "watsonx",
+    failure_threshold=settings.breaker_failure_threshold,
+    recovery_timeout=settings.breaker_recovery_timeout,
+)
+DEGRADED_NOTE = (
+    "[Quick analysis] The detailed AI analysis is temporarily unavailable. "
+    "This assessment comes from our built-in ingredient rules."
+)
+
+# Every generation waits here for a slot and a rate-limit token; interactive scans go first
+admission_control = admission.AdmissionController(
+    "watsonx",
+    max_concurrency=settings.watsonx_max_concurrency,
+    rate=settings.watsonx_rate_limit,
+    burst=settings.watsonx_burst,
+    max_queue=settings.watsonx_queue_size,
+    processes=settings.web_concurrency,
+)
+
+# Generations are blocking SDK calls; they run here so the event loop stays free.
+_executor = ThreadPoolExecutor(
+    max_workers=admission_control.max_concurrency,
+    thread_name_prefix="watsonx",
+)
+
+
+def _queue_wait() -> float:
+    """How long the current call may wait for admission: its priority's limit, within the request's deadline."""
+    if admission.current_priority() == admission.INTERACTIVE:
+        limit = settings.watsonx_queue_wait
+    else:
+        limit = settings.watsonx_batch_queue_wait
+    return resilience.timeout_for(limit)
+
+
+def _generation_params(max_new_tokens: int = 600) -> dict:
+    # Keys are the SDK's GenTextParamsMetaNames values, spelled out so building params needs no SDK import
+    return {
+        "decoding_method": "greedy",
+        "max_new_tokens": max_new_tokens,
+        "min_new_tokens": 10,
+        # We removed "}" from stop sequences since we aren't generating JSON
+        "repetition_penalty": 1.1
+    }
+
+
+def _build_model():
     creds = {
         "url": settings.ibm_service_url,
         "apikey": settings.ibm_api_key
     }
-    
-    # Initialize Model
-    model_id = "ibm/granite-3-8b-instruct"
-    
-    params = {
-        GenParams.DECODING_METHOD: "greedy",
-        GenParams.MAX_NEW_TOKENS: 600,
-        GenParams.MIN_NEW_TOKENS: 10,
-        # We removed "}" from stop sequences since we aren't generating JSON
-        GenParams.REPETITION_PENALTY: 1.1
-    }
 
-    model = Model(
-        model_id=model_id,
-        params=params,
+    Model = _model_class()
+    if Model is None:
+        raise RuntimeError("ibm-watson-machine-learning is not installed")
+    return Model(
+        model_id=MODEL_ID,
+        params=_generation_params(),
         credentials=creds,
         project_id=settings.project_id
     )
 
+
+@lru_cache()
+def get_model_pool() -> ModelPool:
+    # One pool per process, sized to match the executor so a worker never waits for a client
+    pool = ModelPool(
+        _build_model,
+        size=admission_control.max_concurrency,
+        max_age=settings.watsonx_token_refresh_interval,
+    )
+    pool.start_refresher()
+    return pool
+
+
+def warmup() -> None:
+    """Import the SDK and pre-build the watsonx clients (blocking). No-op without credentials."""
+    if not is_configured() or _model_class() is None:
+        return
+    get_model_pool().warmup()
+
+
+def is_configured() -> bool:
+    return bool(settings.ibm_api_key and settings.project_id)
+
+
+def shutdown() -> None:
+    if get_model_pool.cache_info().currsize:
+        get_model_pool().close()
+    _executor.shutdown(wait=False, cancel_futures=True)
+
+
+def normalize_ingredients(text: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different scans share a key."""
+    text = re.sub(r"[^\w%]+", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def analysis_key(ingredients: str, product_name: str = "", prompt_version: str = PROMPT_VERSION) -> str:
+    material = "\x1f".join([
+        MODEL_ID,
+        prompt_version,
+        normalize_ingredients(product_name or ""),
+        normalize_ingredients(ingredients),
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# Prompt version of every analysis mode that is cached ("fast" is not)
+_MODE_PROMPT_VERSIONS = {
+    "full": PROMPT_VERSION,
+    "assisted": ASSISTED_PROMPT_VERSION,
+    "incremental": INCREMENTAL_PROMPT_VERSION,
+    "structured": STRUCTURED_PROMPT_VERSION,
+}
+
+
+def mode_key(mode: str, ingredients: str, product_name: str = "", findings: Optional[AnalysisResult] = None) -> str:
+    """
+    Cache key of one mode's analysis of an ingredient list. Assisted keys also
+    cover the rule engine's findings (detected here unless given), since they
+    are part of the prompt.
+    """
+    prompt_version = _MODE_PROMPT_VERSIONS[mode]
+    if mode == "assisted":
+        findings = findings or rule_engine.detect(ingredients, product_name)
+        findings_hash = hashlib.sha256(rule_engine.render_findings(findings).encode("utf-8")).hexdigest()[:8]
+        prompt_version = f"{prompt_version}:{findings_hash}"
+    return analysis_key(ingredients, product_name, prompt_version=prompt_version)
+
+
+def _request_key(ingredients: str, product_name: str = "", findings: Optional[AnalysisResult] = None) -> str:
+    """Cache key for one text analysis request: assisted with `findings`, full without."""
+    return mode_key("full" if findings is None else "assisted", ingredients, product_name, findings)
+
+
+def invalidate_analysis(ingredients: str, product_name: str = "") -> None:
+    """Drop every mode's cached analysis of one ingredient list under the current prompts/model."""
+    for mode in _MODE_PROMPT_VERSIONS:
+        analysis_cache.delete(mode_key(mode, ingredients, product_name))
+
+
+def clear_analysis_cache() -> None:
+    """Drop every cached analysis, in memory and on disk."""
+    analysis_cache.clear()
+
+class MarkdownStripper:
+    """
+    Incremental version of the final-text cleanup: drops `**`, `##` and ``` from a
+    stream of chunks, even when a marker is split across two chunks, and trims
+    leading/trailing whitespace of the whole text.
+    """
+
+    _MARKERS = re.compile(r"\*\*|##|```")
+
+    def __init__(self):
+        self._pending = ""
+        self._started = False
+
+    def feed(self, chunk: str) -> str:
+        text = self._MARKERS.sub("", self._pending + chunk)
+        # Hold back anything that could still become a marker or trailing whitespace
+        keep = len(text) - len(text.rstrip("*#` \t\r\n"))
+        text, self._pending = text[:len(text) - keep], text[len(text) - keep:]
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        return text
+
+    def flush(self) -> str:
+        text = self._MARKERS.sub("", self._pending).rstrip()
+        self._pending = ""
+        return text if self._started else text.lstrip()
+
+
+def _log_model_output(text: str, started: float, key: str, **fields) -> None:
+    # Enqueued only; the file write happens on the logging thread
+    model_output_logger.info(
+        "analysis generated",
+        extra={
+            "model": MODEL_ID,
+            "analysis_key": key,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "output": text,
+            **fields,
+        },
+    )
+
+
+def _generate(prompt_input: str, params: Optional[dict] = None) -> Tuple[str, dict]:
+    """One blocking generation: cleaned text and token usage. Errors propagate."""
+    with get_model_pool().acquire() as model, metrics.track("watsonx", "generate"):
+        # `generate` (not `generate_text`) so the token counts come back too
+        response = model.generate(prompt=prompt_input, params=params)
+
+    usage = {}
+    # Standardize extraction
+    if isinstance(response, dict):
+        result = (response.get('results') or [response])[0]
+        usage = {
+            "input_tokens": result.get('input_token_count'),
+            "generated_tokens": result.get('generated_token_count'),
+        }
+        metrics.record_tokens(MODEL_ID, usage["input_tokens"], usage["generated_tokens"])
+        raw_text = result.get('generated_text') or result.get('text') or str(response)
+    elif hasattr(response, 'generated_text'):
+        raw_text = response.generated_text
+    else:
+        raw_text = str(response)
+
+    # Cleanup: Ensure no stray markdown remains if the model hallucinates it
+    return raw_text.replace("**", "").replace("##", "").replace("```", "").strip(), usage
+
+
+def _mock_analysis(ingredients: str) -> str:
+    # Fallback/Mock for testing without keys
+    return (
+        "[MOCK] Analysis requires IBM Cloud credentials. Ingredients received: " + ingredients[:50] + "...\n"
+        "Configure .env with IBM keys to get real analysis."
+    )
+
+
+def analyze_ingredients_with_watson(
+    ingredients: str,
+    product_name: str = "",
+    findings: Optional[AnalysisResult] = None,
+) -> str:
+    """
+    Analyzes the ingredients list using IBM watsonx.ai to identify health concerns.
+
+    With `findings` from the local rule engine, the model gets a shorter prompt and
+    token budget, and the rule engine's KEY RISKS / MARKETING TRAPS sections are
+    appended to its answer.
+    """
+    
+    if not is_configured():
+        return _mock_analysis(ingredients)
+
+    key = _request_key(ingredients, product_name, findings)
+    if findings is None:
+        prompt_input = PROMPT_TEMPLATE.format(product_name=product_name, ingredients=ingredients)
+        params = None
+    else:
+        findings_text = rule_engine.render_findings(findings)
+        prompt_input = ASSISTED_PROMPT_TEMPLATE.format(
+            findings=findings_text, product_name=product_name, ingredients=ingredients
+        )
+        params = _generation_params(ASSISTED_MAX_NEW_TOKENS)
+
+    cached = analysis_cache.get(key)
+    if cached is not MISS:
+        return cached
+    breaker.check()
+
     try:
-        response = model.generate_text(prompt=prompt_input)
-        
-        # Standardize extraction
-        if isinstance(response, dict):
-            raw_text = response.get('generated_text') or response.get('text') or str(response)
-        elif hasattr(response, 'generated_text'):
-            raw_text = response.generated_text
-        else:
-            raw_text = str(response)
-
-        # Cleanup: Ensure no stray markdown remains if the model hallucinates it
-        final_text = raw_text.replace("**", "").replace("##", "").replace("```", "").strip()
+        started = time.perf_counter()
+        final_text, usage = _generate(prompt_input, params)
+        breaker.record_success()
+
+        if findings is not None:
+            final_text = f"{final_text}\n\n{findings_text}"
         
-        logger.info(f"AI TEXT OUTPUT: {final_text}")
+        _log_model_output(
+            final_text, started, key,
+            prompt_version=PROMPT_VERSION if findings is None else ASSISTED_PROMPT_VERSION, **usage
+        )
 
+        analysis_cache.set(key, final_text)
         return final_text
 
     except Exception as e:
+        breaker.record_failure()
         logger.exception(f"Critical error in analysis: {e}")
-        return "Error: A system error occurred during the ingredient analysis. Please try again later."
\ No newline at end of file
+        return f"{ERROR_PREFIX} A system error occurred during the ingredient analysis. Please try again later."
+
+
+async def analyze_ingredients_async(
+    ingredients: str,
+    product_name: str = "",
+    findings: Optional[AnalysisResult] = None,
+) -> str:
+    """
+    Event-loop friendly wrapper: runs `analyze_ingredients_with_watson` on the
+    bounded watsonx executor, within the request's deadline.
+
+    Degrades instead of failing: when watsonx errors, times out or its breaker
+    is open, the rule engine's analysis is returned, prefixed with `DEGRADED_NOTE`.
+    """
+    return await _run_with_fallback(
+        _request_key(ingredients, product_name, findings),
+        partial(analyze_ingredients_with_watson, ingredients, product_name, findings),
+        ingredients, product_name, findings,
+    )
+
+
+def _admitted(analyze: Callable[[], str]) -> Callable[[], Awaitable[str]]:
+    """
+    `analyze` as a coroutine function that waits for admission, then runs on the
+    watsonx executor for at most `watsonx_timeout`. Only that second wait counts
+    against the breaker: time spent queued says nothing about watsonx's health.
+    """
+
+    async def run():
+        await admission_control.acquire(max_wait=_queue_wait())
+        timeout = resilience.timeout_for(settings.watsonx_timeout)
+        # Carry the request's trace into the executor thread
+        generation = asyncio.get_running_loop().run_in_executor(_executor, tracing.propagate(analyze))
+        # The slot is held until the generation ends, even if it outlives the timeout
+        generation.add_done_callback(lambda _: admission_control.release())
+        try:
+            return await asyncio.wait_for(asyncio.shield(generation), timeout)
+        except asyncio.TimeoutError:
+            # Only a full-length timeout says watsonx is slow; a shortened one means our budget ran out
+            if timeout >= settings.watsonx_timeout:
+                breaker.record_failure()
+            raise
+
+    return run
+
+
+def _admission_and_model_timeout() -> float:
+    """How long a caller waits for a generation: its queue limit, then the model's timeout."""
+    return resilience.timeout_for(_queue_wait() + settings.watsonx_timeout)
+
+
+def _is_expired(key: str) -> bool:
+    _, expires_at = analysis_cache.peek(key)
+    return expires_at <= time.time()
+
+
+async def refresh_analysis(ingredients: str, product_name: str = "") -> str:
+    """Generate the default (full mode) analysis at background priority, even if a stale copy is cached."""
+    with admission.priority(admission.BACKGROUND):
+        key = analysis_key(ingredients, product_name)
+        return await _analysis_flights.do(key, _admitted(partial(analyze_ingredients_with_watson, ingredients, product_name)))
+
+
+async def _run_with_fallback(
+    key: str, analyze: Callable[[], str], ingredients: str, product_name: str, findings: Optional[AnalysisResult]
+) -> str:
+    """
+    Run a blocking text analysis on the watsonx executor once admitted; rule-engine
+    text if it is shed, fails or runs out of time. An expired analysis is returned
+    as is while a new one is generated in the background.
+    """
+    cached = analysis_cache.get_stale(key)
+    if cached is not MISS:
+        # Cached answers never queue behind generations
+        if _is_expired(key):
+            refresher.revalidate(f"analysis:{key}", partial(_analysis_flights.do, key, _admitted(analyze)))
+        return cached
+
+    run = _admitted(analyze)
+    try:
+        # Concurrent requests for the same analysis wait on a single generation.
+        # On timeout the shared generation keeps running and still fills the cache;
+        # the breaker is charged by `run`, and only if watsonx itself was slow.
+        text = await asyncio.wait_for(_analysis_flights.do(key, run), _admission_and_model_timeout())
+    except resilience.CircuitOpen:
+        return _degraded_analysis(ingredients, product_name, findings, "circuit_open")
+    except admission.Shed:
+        return _degraded_analysis(ingredients, product_name, findings, "shed")
+    except asyncio.TimeoutError:
+        return _degraded_analysis(ingredients, product_name, findings, "timeout")
+    if text.startswith(ERROR_PREFIX):
+        return _degraded_analysis(ingredients, product_name, findings, "error")
+    return text
+
+
+_ASSESSMENT_BULLET = re.compile(r"^\s*(?:[-*\u2022]|\d+[.)])\s*")
+
+
+def _assess_ingredients(names: List[str]) -> Tuple[Dict[str, dict], dict]:
+    """
+    Ask the model about ingredients with no memoized assessment, in batches, and
+    memoize what comes back. Returns the new assessments and the summed token usage.
+    """
+    assessments: Dict[str, dict] = {}
+    usage = {"input_tokens": 0, "generated_tokens": 0}
+    for start in range(0, len(names), INGREDIENT_BATCH_SIZE):
+        batch = names[start:start + INGREDIENT_BATCH_SIZE]
+        prompt_input = INGREDIENT_PROMPT_TEMPLATE.format(ingredients="\n".join(batch))
+        text, batch_usage = _generate(prompt_input, _generation_params(INGREDIENT_TOKENS_PER_ITEM * len(batch)))
+        for kind in usage:
+            usage[kind] += batch_usage.get(kind) or 0
+
+        for name, concern, note in _match_assessments(batch, text):
+            if name not in assessments:
+                assessment = ingredient_memo.store(name, concern.lower().replace("concern", ""), note, INGREDIENT_MEMO_VERSION)
+                if assessment is not None:
+                    assessments[name] = assessment
+    return assessments, usage
+
+
+def _match_assessments(batch: List[str], text: str) -> List[Tuple[str, str, str]]:
+    """
+    `(ingredient, concern, note)` for each `name | concern | note` line of `text`
+    that can be tied to an ingredient of `batch`. A line whose name was reworded
+    is tied by position only when the model answered as many lines as were asked
+    and every recognised name is at its own position; otherwise it is dropped
+    (and asked about again next time) rather than memoized against the wrong
+    ingredient.
+    """
+    rows = []
+    for line in text.splitlines():
+        if line.count("|") >= 2:
+            name, concern, note = (part.strip() for part in _ASSESSMENT_BULLET.sub("", line).split("|", 2))
+            rows.append((ingredient_memo.canonical(name), concern, note))
+
+    in_order = len(rows) == len(batch) and all(
+        name == batch[position] for position, (name, _, _) in enumerate(rows) if name in batch
+    )
+    matched = []
+    for position, (name, concern, note) in enumerate(rows):
+        if name not in batch:
+            if not in_order:
+                continue
+            name = batch[position]
+        matched.append((name, concern, note))
+    return matched
+
+
+def analyze_ingredients_incremental(ingredients: str, product_name: str = "") -> str:
+    """
+    Analysis built from memoized per-ingredient assessments. Only ingredients
+    never seen before go to the model; then a short compose step turns the
+    assessments into a verdict. Falls back to the full prompt when the list
+    cannot be split into ingredients.
+    """
+    if not is_configured():
+        return _mock_analysis(ingredients)
+
+    names = ingredient_memo.tokenize(ingredients)
+    if not names:
+        return analyze_ingredients_with_watson(ingredients, product_name)
+
+    key = mode_key("incremental", ingredients, product_name)
+    cached = analysis_cache.get(key)
+    if cached is not MISS:
+        return cached
+    breaker.check()
+
+    assessments = ingredient_memo.lookup(names, INGREDIENT_MEMO_VERSION)
+    novel = [name for name in names if name not in assessments]
+    metrics.INGREDIENT_ASSESSMENTS.labels("memo").inc(len(assessments))
+    try:
+        started = time.perf_counter()
+        usage = {"input_tokens": 0, "generated_tokens": 0}
+        if novel:
+            new, usage = _assess_ingredients(novel)
+            assessments.update(new)
+            metrics.INGREDIENT_ASSESSMENTS.labels("model").inc(len(new))
+
+        assessments_text = ingredient_memo.render(names, assessments)
+        prompt_input = COMPOSE_PROMPT_TEMPLATE.format(product_name=product_name, assessments=assessments_text)
+        composed, compose_usage = _generate(prompt_input, _generation_params(COMPOSE_MAX_NEW_TOKENS))
+        breaker.record_success()
+        for kind in usage:
+            usage[kind] += compose_usage.get(kind) or 0
+
+        final_text = f"{composed}\n\nINGREDIENTS\n{assessments_text}"
+        _log_model_output(
+            final_text, started, key, prompt_version=INCREMENTAL_PROMPT_VERSION,
+            ingredients=len(names), novel_ingredients=len(novel), **usage
+        )
+        # Ingredients the model skipped are retried next time, so only fully assessed analyses are cached
+        if len(assessments) == len(names):
+            analysis_cache.set(key, final_text)
+        return final_text
+
+    except Exception as e:
+        breaker.record_failure()
+        logger.exception(f"Critical error in incremental analysis: {e}")
+        return f"{ERROR_PREFIX} A system error occurred during the ingredient analysis. Please try again later."
+
+
+async def analyze_incremental_async(ingredients: str, product_name: str = "") -> str:
+    """`analyze_ingredients_incremental` on the watsonx executor, degrading like `analyze_ingredients_async`."""
+    return await _run_with_fallback(
+        mode_key("incremental", ingredients, product_name),
+        partial(analyze_ingredients_incremental, ingredients, product_name),
+        ingredients, product_name, None,
+    )
+
+
+def _degraded_analysis(
+    ingredients: str, product_name: str, findings: Optional[AnalysisResult], reason: str
+) -> str:
+    metrics.DEGRADED_RESPONSES.labels("watsonx", reason).inc()
+    findings = findings or rule_engine.detect(ingredients, product_name)
+    return f"{DEGRADED_NOTE}\n\n{rule_engine.render_text(findings)}"
+
+
+def is_degraded(text: str) -> bool:
+    """True for a rule-engine fallback answer; those should not be cached as if they came from the LLM."""
+    return text.startswith(DEGRADED_NOTE)
+
+
+class _TokenStream:
+    """
+    Chunks of `generate_text_stream`, produced on the watsonx executor and consumed
+    with `async for` on the event loop. `close()` stops the generation early.
+    """
+
+    _DONE = object()
+
+    def __init__(self, prompt_input: str, params: Optional[dict] = None):
+        self._loop = asyncio.get_running_loop()
+        self._chunks: asyncio.Queue = asyncio.Queue()
+        self._cancelled = threading.Event()
+        self._loop.run_in_executor(_executor, tracing.propagate(self._produce), prompt_input, params)
+
+    def _produce(self, prompt_input: str, params: Optional[dict]) -> None:
+        put = lambda item: self._loop.call_soon_threadsafe(self._chunks.put_nowait, item)
+        try:
+            with get_model_pool().acquire() as model, metrics.track("watsonx", "generate_stream"):
+                for chunk in model.generate_text_stream(prompt=prompt_input, params=params):
+                    if self._cancelled.is_set():
+                        break
+                    # The stream does not report usage; watsonx sends about one token per chunk
+                    metrics.record_tokens(MODEL_ID, None, 1)
+                    put(chunk)
+        except Exception as e:
+            put(e)
+        finally:
+            put(self._DONE)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        item = await self._chunks.get()
+        if item is self._DONE:
+            raise StopAsyncIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self) -> None:
+        self._cancelled.set()
+
+
+async def stream_analysis(ingredients: str, product_name: str = "") -> AsyncIterator[str]:
+    """
+    Same analysis as `analyze_ingredients_with_watson`, but yields cleaned text
+    as the model produces it. The finished text is cached like a normal analysis;
+    a cached analysis is yielded in one piece.
+    """
+    if not is_configured():
+        yield _mock_analysis(ingredients)
+        return
+
+    key = analysis_key(ingredients, product_name)
+    cached = analysis_cache.get_stale(key)
+    if cached is not MISS:
+        if _is_expired(key):
+            refresher.revalidate(f"analysis:{key}", partial(refresh_analysis, ingredients, product_name))
+        yield cached
+        return
+    if not breaker.allow():
+        yield _degraded_analysis(ingredients, product_name, None, "circuit_open")
+        return
+    try:
+        await admission_control.acquire(max_wait=_queue_wait())
+    except admission.Shed:
+        yield _degraded_analysis(ingredients, product_name, None, "shed")
+        return
+
+    prompt_input = PROMPT_TEMPLATE.format(product_name=product_name, ingredients=ingredients)
+    started = time.perf_counter()
+    stream = _TokenStream(prompt_input)
+
+    stripper = MarkdownStripper()
+    parts = []
+    try:
+        async for chunk in stream:
+            text = stripper.feed(chunk)
+            if text:
+                parts.append(text)
+                yield text
+
+        tail = stripper.flush()
+        if tail:
+            parts.append(tail)
+            yield tail
+
+        breaker.record_success()
+        final_text = "".join(parts)
+        _log_model_output(final_text, started, key, prompt_version=PROMPT_VERSION, streamed=True)
+        analysis_cache.set(key, final_text)
+    except Exception as e:
+        breaker.record_failure()
+        logger.exception(f"Critical error in streamed analysis: {e}")
+        raise
+    finally:
+        # Client went away or we finished: stop pulling tokens from watsonx
+        stream.close()
+        admission_control.release()
+
+
+async def stream_structured_analysis(ingredients: str, product_name: str = "") -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Structured analysis as JSON matching `AnalysisResult`, parsed while it is generated.
+
+    Yields `(field, value)` for each top-level field as soon as it is complete and
+    valid (values are JSON-ready), then `("result", AnalysisResult)` last. Generation
+    stops as soon as the model closes the object. Without IBM credentials the
+    local rule engine's result is returned instead.
+    """
+    if not is_configured():
+        yield "result", rule_engine.detect(ingredients, product_name)
+        return
+
+    key = mode_key("structured", ingredients, product_name)
+    cached = analysis_cache.get(key)
+    if cached is not MISS:
+        yield "result", AnalysisResult.model_validate_json(cached)
+        return
+    if not breaker.allow():
+        metrics.DEGRADED_RESPONSES.labels("watsonx", "circuit_open").inc()
+        yield "result", rule_engine.detect(ingredients, product_name)
+        return
+    try:
+        await admission_control.acquire(max_wait=_queue_wait())
+    except admission.Shed:
+        metrics.DEGRADED_RESPONSES.labels("watsonx", "shed").inc()
+        yield "result", rule_engine.detect(ingredients, product_name)
+        return
+
+    prompt_input = STRUCTURED_PROMPT_TEMPLATE.format(product_name=product_name, ingredients=ingredients)
+    started = time.perf_counter()
+    stream = _TokenStream(prompt_input, _generation_params(STRUCTURED_MAX_NEW_TOKENS))
+    parser = ObjectStreamParser()
+    fields = {}
+    try:
+        async for chunk in stream:
+            for name, value in parser.feed(chunk):
+                adapter = _FIELD_ADAPTERS.get(name)
+                if adapter is None or name == "product_name":
+                    continue
+                try:
+                    fields[name] = adapter.validate_python(value)
+                except ValidationError as e:
+                    parser.errors.append(f"{name}: {e.error_count()} validation error(s)")
+                    continue
+                yield name, adapter.dump_python(fields[name], mode="json")
+            if parser.done:
+                break
+        breaker.record_success()
+    except Exception as e:
+        breaker.record_failure()
+        logger.exception(f"Critical error in structured analysis: {e}")
+        raise
+    finally:
+        # Closing brace seen (or client gone): stop paying for output tokens
+        stream.close()
+        admission_control.release()
+
+    if parser.errors:
+        logger.warning(f"Structured analysis dropped fields: {parser.errors}")
+    if not fields:
+        raise ValueError("Model returned no usable JSON")
+
+    result = AnalysisResult(product_name=product_name or "", **fields)
+    final_json = result.model_dump_json()
+    _log_model_output(final_json, started, key, prompt_version=STRUCTURED_PROMPT_VERSION, complete=parser.done)
+    # A truncated object (token limit hit) is returned but not cached
+    if parser.done:
+        analysis_cache.set(key, final_json)
+    yield "result", result
+
+
+async def analyze_structured_async(ingredients: str, product_name: str = "") -> AnalysisResult:
+    """
+    Non-streaming form of `stream_structured_analysis`: just the final `AnalysisResult`.
+    Falls back to the rule engine's result if the model fails or runs past the deadline.
+    """
+
+    async def collect() -> AnalysisResult:
+        result = None
+        async for name, value in stream_structured_analysis(ingredients, product_name):
+            if name == "result":
+                result = value
+        return result
+
+    key = mode_key("structured", ingredients, product_name)
+    try:
+        # The generation queues for admission first, so the wait covers both
+        return await asyncio.wait_for(_analysis_flights.do(key, collect), _admission_and_model_timeout())
+    except asyncio.TimeoutError:
+        reason = "timeout"
+    except Exception:
+        reason = "error"
+    metrics.DEGRADED_RESPONSES.labels("watsonx", reason).inc()
+    return rule_engine.detect(ingredients, product_name)
@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class _PooledClient:
+    __slots__ = ("client", "created_at")
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.created_at = time.monotonic()
+
+
+class ModelPool:
+    """
+    Process-wide pool of long-lived watsonx `Model` clients.
+
+    Building a `Model` costs an IAM token exchange plus a few metadata calls, so
+    we build at most `size` of them and hand them out one caller at a time
+    (the SDK objects are not meant to be shared between threads).
+
+    IAM tokens last ~60 minutes. A background thread swaps idle clients for
+    fresh ones once they are older than `max_age` seconds, so a request never
+    pays for a token refresh on its own critical path.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int, max_age: float):
+        self._factory = factory
+        self.size = size
+        self.max_age = max_age
+        self._idle: List[_PooledClient] = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._refresher = None
+
+    def _new(self) -> _PooledClient:
+        return _PooledClient(self._factory())
+
+    def _reserve(self, block: bool):
+        """Pop an idle client, or reserve a slot to build one. Returns a client, True (slot) or None."""
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    return True
+                if not block:
+                    return None
+                self._cond.wait()
+
+    def _reserve_slot(self) -> bool:
+        """Reserve a slot to build a new client, if the pool is not full yet."""
+        with self._cond:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _build_reserved(self) -> _PooledClient:
+        try:
+            return self._new()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def _put_back(self, pooled: _PooledClient) -> None:
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    @contextmanager
+    def acquire(self):
+        """Borrow a client for the duration of the `with` block."""
+        pooled = self._reserve(block=True)
+        if pooled is True:
+            pooled = self._build_reserved()
+        healthy = True
+        try:
+            yield pooled.client
+        except Exception:
+            # The client may be in a bad state (expired session, broken socket); rebuild it lazily.
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                self._put_back(pooled)
+            else:
+                self._release_slot()
+
+    def warmup(self) -> None:
+        """Build every client up front and start the token refresher."""
+        with self._cond:
+            missing = self.size - self._created
+        for _ in range(missing):
+            # Only free slots are reserved; idle clients stay where they are
+            if not self._reserve_slot():
+                break
+            try:
+                self._put_back(self._build_reserved())
+            except Exception as e:
+                logger.warning(f"watsonx pool warmup stopped early: {e}")
+                break
+        self.start_refresher()
+
+    def start_refresher(self) -> None:
+        if self._refresher is not None or self.max_age <= 0:
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="watsonx-refresh", daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        interval = max(self.max_age / 4, 1.0)
+        while not self._stop.wait(interval):
+            self.refresh_stale()
+
+    def refresh_stale(self) -> int:
+        """Swap idle clients older than `max_age` for fresh ones. Returns how many were replaced."""
+        now = time.monotonic()
+        with self._cond:
+            stale = [p for p in self._idle if now - p.created_at >= self.max_age]
+
+        replaced = 0
+        for old in stale:
+            # Build outside the lock so requests keep using the old client meanwhile
+            try:
+                fresh = self._new()
+            except Exception as e:
+                # Keep the old client; the SDK will still refresh reactively on use.
+                logger.warning(f"watsonx client refresh failed: {e}")
+                continue
+            with self._cond:
+                if old in self._idle:
+                    self._idle.remove(old)
+                    self._idle.append(fresh)
+                    replaced += 1
+        return replaced
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self.size, "created": self._created, "idle": len(self._idle)}
+
+    def close(self) -> None:
+        self._stop.set()
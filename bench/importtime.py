@@ -0,0 +1,90 @@
+"""
+Import-time profile of the app, for spotting cold-start regressions.
+
+    python -m bench.importtime                      # top 20 imports by cumulative time
+    python -m bench.importtime --top 40 --json
+    python -m bench.importtime --max-ms 800         # exit 1 if importing app.main takes longer
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter (so
+nothing is already cached in sys.modules) and summarises its report. Also flags
+heavy SDKs that should only load on first use but were imported at startup.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+# Packages the app must not import at startup (they are loaded lazily on first real use)
+LAZY_PACKAGES = ("ibm_watson_machine_learning", "ibm_watson", "ibm_cloud_sdk_core", "pandas", "pytesseract")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)$")
+
+
+def profile(module: str = "app.main", runs: int = 1) -> Dict[str, object]:
+    """Import `module` in fresh interpreters and return the fastest run's summary."""
+    best = None
+    for _ in range(runs):
+        env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+        imports: List[dict] = []
+        for line in proc.stderr.splitlines():
+            match = _LINE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports.append({
+                    "module": name,
+                    "self_ms": int(self_us) / 1000,
+                    "cumulative_ms": int(cumulative_us) / 1000,
+                    "depth": (len(indent) - 1) // 2,
+                })
+        total = next((i["cumulative_ms"] for i in imports if i["module"] == module), 0.0)
+        if best is None or total < best["total_ms"]:
+            best = {"total_ms": total, "imports": imports}
+
+    imported = {i["module"].split(".")[0] for i in best["imports"]}
+    best["eager_sdks"] = sorted(p for p in LAZY_PACKAGES if p in imported)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import-time profile of the app")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=3, help="Report the fastest of N fresh imports")
+    parser.add_argument("--max-ms", type=float, help="Fail if the import takes longer than this")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = profile(args.module, args.runs)
+    # Top-level packages (depth 0) are what a change in app code pulls in
+    top = sorted((i for i in report["imports"] if i["depth"] == 0), key=lambda i: -i["cumulative_ms"])[: args.top]
+
+    if args.json:
+        print(json.dumps({"total_ms": report["total_ms"], "eager_sdks": report["eager_sdks"], "top": top}, indent=2))
+    else:
+        print(f"import {args.module}: {report['total_ms']:.1f} ms")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for i in top:
+            print(f"{i['cumulative_ms']:>14.1f} {i['self_ms']:>9.1f}  {i['module']}")
+        if report["eager_sdks"]:
+            print(f"\nWARNING: imported at startup but meant to be lazy: {', '.join(report['eager_sdks'])}")
+
+    failed = bool(report["eager_sdks"])
+    if args.max_ms is not None and report["total_ms"] > args.max_ms:
+        print(f"\nFAIL: {report['total_ms']:.1f} ms exceeds the {args.max_ms:.0f} ms budget", file=sys.stderr)
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
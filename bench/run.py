@@ -0,0 +1,275 @@
+"""
+Latency / throughput benchmark for the API against local stub upstreams.
+
+    python -m bench.run                                   # default scenario
+    python -m bench.run --concurrency 1 16 64 --requests 400 --latency-ms 120 --error-rate 0.02
+    python -m bench.run --out bench/baseline.json         # record a baseline
+    python -m bench.run --compare bench/baseline.json     # exit 1 on regression
+
+Boots bench/stubs.py and bench/serve.py as subprocesses, then drives each
+endpoint at each concurrency level and reports p50/p95/p99 latency, requests
+per second, error count and peak server RSS as JSON.
+
+By default every request uses a distinct barcode / ingredient list, so the
+numbers measure the cold path. Pass --warm-keys N to cycle through N keys and
+measure the cached path instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+import zlib
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+from bench.stubs import add_arguments as add_stub_arguments
+
+ENDPOINTS = ("search", "product", "barcode", "analyze", "analyze_product", "ocr")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _png(seed: int, width: int = 64, height: int = 64) -> bytes:
+    """A small grayscale noise PNG; different seeds give perceptually different images."""
+    rng = random.Random(seed)
+    raw = b"".join(b"\x00" + rng.randbytes(width) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _request_factory(endpoint: str, base: str, warm_keys: int) -> Callable[[aiohttp.ClientSession, int], object]:
+    def key(i: int) -> int:
+        return i % warm_keys if warm_keys else i
+
+    def code(i: int) -> str:
+        return f"89{key(i):011d}"
+
+    def ingredients(i: int) -> str:
+        return f"Refined Wheat Flour (Maida), Sugar, Invert Syrup, Palm Oil, INS 471, Salt, Batch {key(i)}"
+
+    def search(session, i):
+        return session.get(f"{base}/api/v1/search", params={"q": f"stub biscuit {key(i)}", "limit": 10})
+
+    def product(session, i):
+        return session.get(f"{base}/api/v1/product/{code(i)}")
+
+    def barcode(session, i):
+        return session.get(f"{base}/api/v1/barcode/{code(i)}")
+
+    def analyze(session, i):
+        return session.post(f"{base}/api/v1/analyze", json={"ingredients_text": ingredients(i), "product_name": "Bench"})
+
+    def analyze_product(session, i):
+        return session.post(f"{base}/api/v1/analyze/product/{code(i)}")
+
+    def ocr(session, i):
+        form = aiohttp.FormData()
+        # One image per key, so near-duplicate reuse only kicks in with --warm-keys
+        form.add_field("file", _png(key(i)), filename=f"label-{key(i)}.png", content_type="image/png")
+        return session.post(f"{base}/api/v1/ocr", data=form)
+
+    return {
+        "search": search, "product": product, "barcode": barcode,
+        "analyze": analyze, "analyze_product": analyze_product, "ocr": ocr,
+    }[endpoint]
+
+
+async def _drive(endpoint: str, base: str, concurrency: int, total: int, warm_keys: int,
+                 offset: int, server_pid: int) -> Dict[str, float]:
+    make_request = _request_factory(endpoint, base, warm_keys)
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(offset, offset + total))
+    peak_rss = _rss_mb(server_pid) or 0.0
+    sampling = True
+
+    async def sample_memory():
+        nonlocal peak_rss
+        while sampling:
+            peak_rss = max(peak_rss, _rss_mb(server_pid) or 0.0)
+            await asyncio.sleep(0.2)
+
+    async def client(session: aiohttp.ClientSession):
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                async with make_request(session, i) as response:
+                    await response.read()
+                    if response.status >= 400:
+                        errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+    sampler = asyncio.create_task(sample_memory())
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    sampling = False
+    await sampler
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.50), 2),
+        "p95_ms": round(_percentile(latencies, 0.95), 2),
+        "p99_ms": round(_percentile(latencies, 0.99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "peak_rss_mb": round(peak_rss, 1),
+    }
+
+
+async def _wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            try:
+                async with session.get(url) as response:
+                    if response.status < 500:
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def _compare(results: dict, baseline_path: str, tolerance: float) -> List[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for endpoint, levels in results.items():
+        for level, current in levels.items():
+            before = baseline.get(endpoint, {}).get(level)
+            if not before:
+                continue
+            if before["p95_ms"] and current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                regressions.append(f"{endpoint}@{level}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+            if before["rps"] and current["rps"] < before["rps"] * (1 - tolerance):
+                regressions.append(f"{endpoint}@{level}: rps {before['rps']} -> {current['rps']}")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> dict:
+    stub_port, app_port = _free_port(), _free_port()
+    stub_url = f"http://127.0.0.1:{stub_port}"
+    base = f"http://127.0.0.1:{app_port}"
+
+    stub_cmd = [
+        sys.executable, "-m", "bench.stubs", "--port", str(stub_port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--payload-kb", str(args.payload_kb),
+        "--token-ms", str(args.token_ms), "--discovery-processing-ms", str(args.discovery_processing_ms),
+    ]
+    app_cmd = [sys.executable, "-m", "bench.serve", "--port", str(app_port), "--stub-url", stub_url]
+
+    stubs = subprocess.Popen(stub_cmd)
+    server = subprocess.Popen(app_cmd, env={**os.environ})
+    try:
+        await _wait_ready(f"{stub_url}/api/v0/product/0.json")
+        await _wait_ready(f"{base}/")
+        results: Dict[str, Dict[str, dict]] = {}
+        offset = 0
+        for endpoint in args.endpoints:
+            results[endpoint] = {}
+            for concurrency in args.concurrency:
+                stats = await _drive(endpoint, base, concurrency, args.requests, args.warm_keys, offset, server.pid)
+                # Fresh keys for every run so one level cannot warm the next
+                offset += args.requests
+                results[endpoint][str(concurrency)] = stats
+                print(f"{endpoint:>16} c={concurrency:<4} {json.dumps(stats)}", file=sys.stderr)
+        return {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "requests_per_level": args.requests,
+                "warm_keys": args.warm_keys,
+                "stub": {
+                    "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+                    "payload_kb": args.payload_kb, "token_ms": args.token_ms,
+                    "discovery_processing_ms": args.discovery_processing_ms,
+                },
+            },
+            "results": results,
+        }
+    finally:
+        for proc in (server, stubs):
+            proc.terminate()
+        for proc in (server, stubs):
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the API against stub upstreams")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint per concurrency level")
+    parser.add_argument("--warm-keys", type=int, default=0, help="Cycle through N keys (0 = every request unique)")
+    parser.add_argument("--out", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95/RPS change vs baseline")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        regressions = _compare(report["results"], args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Run `app.main:app` against the stub upstreams from bench/stubs.py.
+
+    python -m bench.serve --port 8100 --stub-url http://127.0.0.1:9100
+
+Open Food Facts is redirected with OFF_BASE_URL. The watsonx and Discovery SDK
+clients are swapped for thin HTTP clients pointed at the stub, so the service
+code under test (pool, executor, caches, OCR workers) runs unchanged while no
+IAM token exchange or cloud account is needed.
+"""
+import argparse
+import json
+import os
+
+import requests
+import uvicorn
+
+
+class StubModel:
+    """Speaks the watsonx text generation REST API; same call surface the service uses on `Model`."""
+
+    def __init__(self, base_url: str, model_id: str, params: dict):
+        self.base_url = base_url
+        self.model_id = model_id
+        self.params = params
+        self.session = requests.Session()
+
+    def _body(self, prompt: str, params) -> dict:
+        return {"model_id": self.model_id, "input": prompt, "parameters": params or self.params}
+
+    def generate(self, prompt: str, params=None, **kwargs) -> dict:
+        response = self.session.post(f"{self.base_url}/ml/v1/text/generation", json=self._body(prompt, params), timeout=120)
+        response.raise_for_status()
+        return response.json()
+
+    def generate_text(self, prompt: str, params=None, **kwargs) -> str:
+        return self.generate(prompt, params)["results"][0]["generated_text"]
+
+    def generate_text_stream(self, prompt: str, params=None, **kwargs):
+        with self.session.post(
+            f"{self.base_url}/ml/v1/text/generation_stream",
+            json=self._body(prompt, params), stream=True, timeout=120,
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line and line.startswith("data: "):
+                    yield json.loads(line[6:])["results"][0]["generated_text"]
+
+
+def configure(stub_url: str) -> None:
+    """Point settings at the stub and swap the SDK clients. Must run before the app is imported."""
+    os.environ.update({
+        "OFF_BASE_URL": stub_url,
+        "IBM_API_KEY": "bench",
+        "IBM_SERVICE_URL": stub_url,
+        "PROJECT_ID": "bench",
+        "WATSON_DISCOVERY_API_KEY": "bench",
+        "WATSON_DISCOVERY_URL": stub_url,
+        "DISCOVERY_ENVIRONMENT_ID": "bench",
+        "DISCOVERY_COLLECTION_ID": "bench",
+        "OCR_BACKEND": "discovery",
+        "OCR_DISCOVERY_POLL_INTERVAL": "0.05",
+    })
+    os.environ.setdefault("CACHE_DB_PATH", "")
+
+    from app.services import watson_ai_service, watson_ocr_service
+
+    def build_stub_model():
+        return StubModel(stub_url, watson_ai_service.MODEL_ID, watson_ai_service._generation_params())
+
+    def stub_discovery_client():
+        from ibm_watson import DiscoveryV2
+        from ibm_cloud_sdk_core.authenticators import NoAuthAuthenticator
+        discovery = DiscoveryV2(version="2020-08-30", authenticator=NoAuthAuthenticator())
+        discovery.set_service_url(stub_url)
+        return discovery
+
+    watson_ai_service._build_model = build_stub_model
+    watson_ai_service.get_model_pool.cache_clear()
+    watson_ocr_service.get_discovery_client = stub_discovery_client
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the app against stub upstreams")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--stub-url", required=True)
+    args = parser.parse_args()
+
+    configure(args.stub_url)
+    from app.main import app
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Local stand-ins for Open Food Facts, watsonx.ai text generation and Watson
+Discovery, with injectable latency, error rate and payload size.
+
+    python -m bench.stubs --port 9100 --latency-ms 80 --error-rate 0.01 --payload-kb 200
+
+All three APIs are served from one aiohttp app:
+
+    GET  /cgi/search.pl                                  OFF search
+    GET  /api/v0/product/{code}.json                     OFF product (codes starting with "0" are "not found")
+    POST /ml/v1/text/generation                          watsonx generate
+    POST /ml/v1/text/generation_stream                   watsonx generate (SSE)
+    POST /v2/projects/{p}/collections/{c}/documents      Discovery add_document
+    GET  /v2/projects/{p}/collections/{c}/documents/{id} Discovery get_document
+    POST /v2/projects/{p}/query                          Discovery query
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from aiohttp import web
+
+INGREDIENTS = (
+    "Refined Wheat Flour (Maida), Sugar, Edible Vegetable Oil (Palm), Invert Syrup, "
+    "Milk Solids, Raising Agents (500(ii), 503(ii)), Salt, Emulsifiers (471, 322), "
+    "Artificial Flavouring Substances (Vanilla)"
+)
+
+ANALYSIS_TEXT = (
+    "OVERALL VERDICT\nConsume With Caution\n\n"
+    "SUMMARY\nA refined-flour biscuit with added sugar and invert syrup; the 'atta' claim is misleading.\n\n"
+    "KEY RISKS\nRefined Wheat Flour (Maida): low fibre, spikes blood sugar\n"
+    "Invert Syrup: a hidden sugar\nPalm Oil: high in saturated fat\n\n"
+    "POSITIVE HIGHLIGHTS\nContains some milk solids\n\n"
+    "RECOMMENDATION\nAn occasional snack at most; not suitable as a daily breakfast for children.\n\n"
+    "MARKETING TRAPS\nThe pack suggests whole wheat but the first ingredient is maida."
+)
+
+
+class StubConfig:
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float,
+                 payload_kb: int, token_ms: float, discovery_processing_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_kb = payload_kb
+        self.token_ms = token_ms
+        self.discovery_processing_ms = discovery_processing_ms
+
+
+def build_app(config: StubConfig) -> web.Application:
+    padding = "x" * (config.payload_kb * 1024)
+    documents = {}
+
+    async def delay(extra_ms: float = 0.0) -> None:
+        jitter = random.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0.0
+        await asyncio.sleep(max(0.0, config.latency_ms + jitter + extra_ms) / 1000)
+
+    def failed() -> bool:
+        return config.error_rate > 0 and random.random() < config.error_rate
+
+    def product(code: str) -> dict:
+        return {
+            "code": code,
+            "product_name": f"Stub Atta Biscuit {code}",
+            "brands": "Stub Foods",
+            "image_front_url": f"https://images.example/{code}.jpg",
+            "image_front_small_url": f"https://images.example/{code}.200.jpg",
+            "ingredients_text": INGREDIENTS,
+            "nutriments": {"energy-kcal_100g": 480, "sugars_100g": 24.5, "fat_100g": 18.2, "salt_100g": 0.6},
+            # Stands in for the images/languages/nutriment variants real OFF responses carry
+            "_padding": padding,
+        }
+
+    @web.middleware
+    async def inject_errors(request, handler):
+        if failed():
+            await delay()
+            return web.json_response({"error": "injected failure"}, status=503)
+        return await handler(request)
+
+    async def off_search(request):
+        await delay()
+        page_size = int(request.query.get("page_size", 10))
+        terms = request.query.get("search_terms", "")
+        products = [
+            {
+                "code": f"89{abs(hash((terms, i))) % 10**11:011d}",
+                "product_name": f"{terms.title()} {i}",
+                "brands": "Stub Foods",
+                "image_front_small_url": "https://images.example/s.jpg",
+            }
+            for i in range(page_size)
+        ]
+        return web.json_response({"count": page_size, "products": products})
+
+    async def off_product(request):
+        await delay()
+        code = request.match_info["code"]
+        if code.startswith("0"):
+            return web.json_response({"status": 0, "status_verbose": "product not found"})
+        return web.json_response({"status": 1, "code": code, "product": product(code)})
+
+    def _tokens(body: dict) -> int:
+        params = body.get("parameters") or {}
+        return min(len(ANALYSIS_TEXT.split()), int(params.get("max_new_tokens", 600)))
+
+    async def generate(request):
+        body = await request.json()
+        tokens = _tokens(body)
+        await delay(tokens * config.token_ms)
+        text = " ".join(ANALYSIS_TEXT.split(" ")[:tokens])
+        return web.json_response({
+            "model_id": body.get("model_id"),
+            "results": [{"generated_text": text, "generated_token_count": tokens,
+                         "input_token_count": len(body.get("input", "").split()), "stop_reason": "eos_token"}],
+        })
+
+    async def generate_stream(request):
+        body = await request.json()
+        tokens = _tokens(body)
+        await delay()
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for word in ANALYSIS_TEXT.split(" ")[:tokens]:
+            await asyncio.sleep(config.token_ms / 1000)
+            event = {"results": [{"generated_text": word + " "}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def add_document(request):
+        await delay()
+        await request.read()
+        doc_id = uuid.uuid4().hex
+        documents[doc_id] = time.monotonic() + config.discovery_processing_ms / 1000
+        return web.json_response({"document_id": doc_id, "status": "processing"}, status=202)
+
+    async def get_document(request):
+        await delay()
+        doc_id = request.match_info["doc_id"]
+        ready_at = documents.get(doc_id)
+        if ready_at is None:
+            return web.json_response({"error": "not found"}, status=404)
+        status = "available" if time.monotonic() >= ready_at else "processing"
+        return web.json_response({"document_id": doc_id, "status": status})
+
+    async def query(request):
+        await delay()
+        return web.json_response({"matching_results": 1, "results": [{"text": [INGREDIENTS]}]})
+
+    app = web.Application(middlewares=[inject_errors])
+    app.router.add_get("/cgi/search.pl", off_search)
+    app.router.add_get("/api/v0/product/{code}.json", off_product)
+    app.router.add_post("/ml/v1/text/generation", generate)
+    app.router.add_post("/ml/v1/text/generation_stream", generate_stream)
+    app.router.add_post("/v2/projects/{project}/collections/{collection}/documents", add_document)
+    app.router.add_get("/v2/projects/{project}/collections/{collection}/documents/{doc_id}", get_document)
+    app.router.add_post("/v2/projects/{project}/query", query)
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Base latency per upstream call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 503")
+    parser.add_argument("--payload-kb", type=int, default=100, help="Extra bytes in each OFF product payload")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="Generation time per output token")
+    parser.add_argument("--discovery-processing-ms", type=float, default=500.0)
+
+
+def config_from_args(args: argparse.Namespace) -> StubConfig:
+    return StubConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        payload_kb=args.payload_kb,
+        token_ms=args.token_ms,
+        discovery_processing_ms=args.discovery_processing_ms,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stub upstreams for benchmarking")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    web.run_app(build_app(config_from_args(args)), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Production server: gunicorn pre-forks uvicorn workers.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- WEB_CONCURRENCY workers (default: one per CPU this container may use,
+  counting the cgroup CPU quota and affinity mask, at most MAX_DEFAULT_WORKERS).
+- `kill -HUP <master pid>` starts fresh workers and retires the old ones
+  gracefully (in-flight requests get GRACEFUL_TIMEOUT seconds), e.g. after a
+  config change. Workers are also recycled after MAX_REQUESTS (+ jitter).
+- Workers share the SQLite cache tier at CACHE_DB_PATH, so an OFF product or
+  analysis fetched by one worker is a hit for all of them. Point it at
+  /dev/shm (e.g. CACHE_DB_PATH=/dev/shm/label_padhega.sqlite3) to keep that
+  tier in shared memory.
+- /metrics aggregates every worker through PROMETHEUS_MULTIPROC_DIR.
+- Each worker writes model outputs to its own MODEL_LOG_PATH file, named by
+  worker slot ("{worker}": 0, 1, ...) rather than pid. A recycled worker takes
+  over the slot (and file set) of the one it replaces, so logs/ holds at most
+  about 2 x WEB_CONCURRENCY file sets (old and new workers overlap on -HUP).
+"""
+import math
+import os
+import shutil
+
+# Must be in the environment before the settings are read and before workers import prometheus_client
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/label_padhega_metrics")
+# One model-output log per worker slot: rotating a shared file from several processes loses records
+os.environ.setdefault("MODEL_LOG_PATH", "logs/model_output.{worker}.log")
+
+from app.config import get_settings  # noqa: E402
+
+settings = get_settings()
+
+# Each worker holds its own watsonx client pool, caches and thread pools
+MAX_DEFAULT_WORKERS = 4
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().split()
+    except OSError:
+        return None
+
+
+def _available_cpus():
+    """CPUs this process may actually use: the affinity mask, limited by a cgroup CPU quota if one is set."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # macOS
+        cpus = os.cpu_count() or 1
+    # cgroup v2 ("max 100000" or "<quota> <period>"), then cgroup v1
+    quota = _read("/sys/fs/cgroup/cpu.max")
+    if quota is None:
+        v1_quota, v1_period = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us"), _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+        quota = v1_quota + v1_period if v1_quota and v1_period else None
+    if quota and len(quota) == 2 and quota[0] not in ("max", "-1"):
+        try:
+            cpus = min(cpus, math.ceil(int(quota[0]) / int(quota[1])))
+        except (ValueError, ZeroDivisionError):
+            pass
+    return max(1, cpus)
+
+
+bind = f"{settings.host}:{settings.port}"
+workers = settings.web_concurrency or min(_available_cpus(), MAX_DEFAULT_WORKERS)
+# Workers split the upstream admission limits between them (see app/services/admission.py), so they
+# need the final count. They fork from this process, so re-read the settings with it in place.
+os.environ["WEB_CONCURRENCY"] = str(workers)
+get_settings.cache_clear()
+worker_class = "uvicorn_worker.UvicornWorker"
+graceful_timeout = settings.graceful_timeout
+timeout = settings.worker_timeout
+keepalive = 5
+max_requests = settings.max_requests
+max_requests_jitter = settings.max_requests_jitter
+# Each worker opens its own SQLite connections, thread pools and HTTP sessions after the fork
+preload_app = False
+accesslog = "-"
+
+_metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+
+
+def on_starting(server):
+    # Stale files from a previous run would be summed into the new totals
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+
+
+def pre_fork(server, worker):
+    # Lowest slot no live worker holds; server.WORKERS does not include this worker yet
+    taken = {getattr(w, "slot", None) for w in server.WORKERS.values()}
+    worker.slot = next(slot for slot in range(len(taken) + 1) if slot not in taken)
+
+
+def post_fork(server, worker):
+    # In the new worker, before the app (and its settings) are imported
+    os.environ["MODEL_LOG_PATH"] = os.environ["MODEL_LOG_PATH"].replace("{worker}", str(worker.slot))
+    get_settings.cache_clear()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,4 @@
+import os
+
+# Before any app module reads the settings: keep tests' caches in memory, not in the shared .cache/ file
+os.environ["CACHE_DB_PATH"] = ""
@@ -0,0 +1,133 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.admission import BACKGROUND, BATCH, INTERACTIVE, AdmissionController, Shed, priority
+
+
+def _controller(**kwargs) -> AdmissionController:
+    options = dict(max_concurrency=1, rate=0, burst=1, max_queue=10)
+    options.update(kwargs)
+    return AdmissionController("test", **options)
+
+
+def test_admits_immediately_under_the_limits():
+    async def scenario():
+        gate = _controller(max_concurrency=2)
+        await gate.acquire()
+        await gate.acquire()
+        return gate.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 2 and stats["admitted"] == 2
+
+
+def test_higher_priority_goes_first_fifo_within_a_priority():
+    async def scenario():
+        gate = _controller()
+        order = []
+
+        async def call(name, level):
+            async with gate.slot(level):
+                order.append(name)
+
+        await gate.acquire()
+        # Queued in the worst order: background first, interactive last
+        waiters = [
+            asyncio.ensure_future(call(name, level))
+            for name, level in [("bg", BACKGROUND), ("batch-1", BATCH), ("batch-2", BATCH), ("ui", INTERACTIVE)]
+        ]
+        await asyncio.sleep(0)
+        gate.release()
+        await asyncio.gather(*waiters)
+        return order
+
+    assert asyncio.run(scenario()) == ["ui", "batch-1", "batch-2", "bg"]
+
+
+def test_priority_comes_from_the_context():
+    async def scenario():
+        gate = _controller()
+        order = []
+
+        async def call(name):
+            async with gate.slot():
+                order.append(name)
+
+        await gate.acquire()
+        with priority(BACKGROUND):
+            background = asyncio.ensure_future(call("bg"))
+        interactive = asyncio.ensure_future(call("ui"))
+        await asyncio.sleep(0)
+        gate.release()
+        await asyncio.gather(background, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["ui", "bg"]
+
+
+def test_queued_call_shed_after_max_wait():
+    async def scenario():
+        gate = _controller()
+        await gate.acquire()
+        started = time.monotonic()
+        with pytest.raises(Shed) as shed:
+            await gate.acquire(BATCH, max_wait=0.05)
+        return gate, shed.value, time.monotonic() - started
+
+    gate, shed, waited = asyncio.run(scenario())
+    assert shed.priority == BATCH and waited >= 0.05
+    stats = gate.stats()
+    assert stats["shed"] == 1 and stats["active"] == 1
+    assert sum(stats["queued"].values()) == 0
+
+
+def test_full_queue_sheds_new_arrivals_immediately():
+    async def scenario():
+        gate = _controller(max_queue=1)
+        await gate.acquire()
+        queued = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as shed:
+            await gate.acquire()
+        queued.cancel()
+        return shed.value
+
+    assert asyncio.run(scenario()).waited == 0.0
+
+
+def test_token_bucket_spaces_out_starts():
+    async def scenario():
+        gate = _controller(max_concurrency=10, rate=20, burst=2)
+        started = time.monotonic()
+        for _ in range(4):
+            await gate.acquire()
+        return time.monotonic() - started
+
+    # Two from the burst, then one token every 50 ms
+    assert 0.09 <= asyncio.run(scenario()) < 0.5
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    async def scenario():
+        gate = _controller()
+        await gate.acquire()
+        waiter = asyncio.ensure_future(gate.acquire())
+        await asyncio.sleep(0)
+        # The slot is handed to the waiter, which is cancelled before it gets to run
+        gate.release()
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        await asyncio.wait_for(gate.acquire(), 1)
+        return gate.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 1 and sum(stats["queued"].values()) == 0
+
+
+def test_limits_split_across_processes():
+    gate = AdmissionController("test", max_concurrency=8, rate=8.0, burst=8, max_queue=10, processes=4)
+    assert (gate.max_concurrency, gate.rate, gate.burst) == (2, 2.0, 2)
+    single = AdmissionController("test", max_concurrency=2, rate=1.0, burst=1, max_queue=10, processes=4)
+    assert (single.max_concurrency, single.burst) == (1, 1)
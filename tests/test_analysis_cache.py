@@ -0,0 +1,34 @@
+import pytest
+
+from app.services import rule_engine, watson_ai_service
+from app.services.cache import MISS, TieredCache
+
+INGREDIENTS = "Sugar, Refined Wheat Flour (Maida), Palm Oil, Emulsifier (E471)"
+PRODUCT = "Cream Biscuits"
+
+
+@pytest.fixture
+def analysis_cache(monkeypatch):
+    cache = TieredCache("analysis_test", max_entries=100, ttl=60)
+    monkeypatch.setattr(watson_ai_service, "analysis_cache", cache)
+    return cache
+
+
+def test_invalidate_drops_every_mode(analysis_cache):
+    keys = {mode: watson_ai_service.mode_key(mode, INGREDIENTS, PRODUCT) for mode in watson_ai_service._MODE_PROMPT_VERSIONS}
+    assert len(set(keys.values())) == len(keys)
+    for key in keys.values():
+        analysis_cache.set(key, "cached analysis")
+
+    watson_ai_service.invalidate_analysis(INGREDIENTS, PRODUCT)
+    assert {mode: analysis_cache.get(key) for mode, key in keys.items()} == {mode: MISS for mode in keys}
+
+
+def test_assisted_request_key_is_the_invalidated_key(analysis_cache):
+    # The key an assisted-mode request caches under (see routes/analysis.py `_analyze`)
+    findings = rule_engine.detect(INGREDIENTS, PRODUCT)
+    key = watson_ai_service._request_key(INGREDIENTS, PRODUCT, findings)
+    analysis_cache.set(key, "assisted analysis")
+
+    watson_ai_service.invalidate_analysis(INGREDIENTS, PRODUCT)
+    assert analysis_cache.get(key) is MISS
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from app.services import cache
+from app.services.cache import MISS, TieredCache
+
+
+def _workers(tmp_path, monkeypatch):
+    """Two caches over one database file, as two server workers would have."""
+    monkeypatch.setattr(cache, "GENERATION_CHECK_INTERVAL", 0)
+    db_path = str(tmp_path / "cache.db")
+    return (
+        TieredCache("shared", max_entries=10, ttl=60, db_path=db_path),
+        TieredCache("shared", max_entries=10, ttl=60, db_path=db_path),
+    )
+
+
+def test_delete_reaches_other_workers_memory(tmp_path, monkeypatch):
+    a, b = _workers(tmp_path, monkeypatch)
+    a.set("k", "old")
+    assert b.get("k") == "old"
+    a.delete("k")
+    assert b.get("k") is MISS
+
+
+def test_clear_reaches_other_workers_memory(tmp_path, monkeypatch):
+    a, b = _workers(tmp_path, monkeypatch)
+    a.set("k", "old")
+    assert b.get("k") == "old"
+    b.clear()
+    assert a.get("k") is MISS
+
+
+def test_write_skipped_while_another_worker_holds_the_lock(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    c = TieredCache("busy", max_entries=10, ttl=60, db_path=db_path)
+    other = sqlite3.connect(db_path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    c.set("k", "v")
+    assert time.monotonic() - started < 1
+    other.execute("ROLLBACK")
+    assert c.stats()["skipped_writes"] == 1
+    assert c.get("k") == "v"
+
+
+def test_stale_read_after_own_miss_counts_one_lookup(tmp_path):
+    c = TieredCache("stale", max_entries=10, ttl=60, stale_ttl=600, db_path=str(tmp_path / "cache.db"))
+    c.set("k", "old", ttl=0.01)
+    time.sleep(0.02)
+    assert c.get("k") is MISS
+    assert c.get_stale("k", after_miss=True) == "old"
+    stats = c.stats()
+    assert (stats["misses"], stats["stale_hits"], stats["hits"]) == (1, 1, 0)
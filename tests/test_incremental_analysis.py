@@ -0,0 +1,28 @@
+from app.services.watson_ai_service import _match_assessments
+
+BATCH = ["sugar", "palm oil", "e471"]
+
+
+def test_lines_matched_by_name_in_any_order():
+    text = "e471 | Medium | Emulsifier\nsugar | High | Added sugar\npalm oil | Medium | Saturated fat"
+    assert _match_assessments(BATCH, text) == [
+        ("e471", "Medium", "Emulsifier"),
+        ("sugar", "High", "Added sugar"),
+        ("palm oil", "Medium", "Saturated fat"),
+    ]
+
+
+def test_reworded_name_tied_by_position_when_every_line_is_there():
+    text = "- sugar | High | Added sugar\n- palmolein | Medium | Saturated fat\n- e471 | Medium | Emulsifier"
+    assert ("palm oil", "Medium", "Saturated fat") in _match_assessments(BATCH, text)
+
+
+def test_reworded_name_dropped_when_a_line_is_missing():
+    # The model skipped "palm oil": position 1 now holds the assessment of something else
+    text = "sugar | High | Added sugar\nmono- and diglycerides | Medium | Emulsifier"
+    assert _match_assessments(BATCH, text) == [("sugar", "High", "Added sugar")]
+
+
+def test_reworded_name_dropped_when_lines_are_reordered():
+    text = "e471 | Medium | Emulsifier\nsucrose | High | Added sugar\nsugar | High | Added sugar"
+    assert [name for name, _, _ in _match_assessments(BATCH, text)] == ["e471", "sugar"]
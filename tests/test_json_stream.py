@@ -0,0 +1,65 @@
+from app.services.json_stream import ObjectStreamParser
+
+OBJECT = '{"verdict": "Avoid", "score": 3, "ok": true, "tags": ["a", "b]"], "nested": {"x": "}", "y": [1, {"z": null}]}, "note": "say \\"hi\\""}'
+MEMBERS = [
+    ("verdict", "Avoid"),
+    ("score", 3),
+    ("ok", True),
+    ("tags", ["a", "b]"]),
+    ("nested", {"x": "}", "y": [1, {"z": None}]}),
+    ("note", 'say "hi"'),
+]
+
+
+def _feed_all(parser: ObjectStreamParser, chunks):
+    members = []
+    for chunk in chunks:
+        members += parser.feed(chunk)
+    return members
+
+
+def test_whole_object_in_one_chunk():
+    parser = ObjectStreamParser()
+    assert parser.feed(OBJECT) == MEMBERS
+    assert parser.done and not parser.errors
+
+
+def test_one_character_at_a_time():
+    parser = ObjectStreamParser()
+    assert _feed_all(parser, OBJECT) == MEMBERS
+    assert parser.done
+
+
+def test_every_split_point():
+    for split in range(1, len(OBJECT)):
+        parser = ObjectStreamParser()
+        assert _feed_all(parser, [OBJECT[:split], OBJECT[split:]]) == MEMBERS, split
+
+
+def test_members_arrive_as_soon_as_complete():
+    parser = ObjectStreamParser()
+    assert parser.feed('{"verdict": "Av') == []
+    assert parser.feed('oid", "score": 1') == [("verdict", "Avoid")]
+    # A bare number only ends at the next delimiter
+    assert parser.feed("2,") == [("score", 12)]
+    assert not parser.done
+
+
+def test_preamble_skipped_and_trailing_text_ignored():
+    parser = ObjectStreamParser()
+    members = _feed_all(parser, ["Here is the JSON:\n```json\n", '{"a": 1}', '\n```\n{"b": 2}'])
+    assert members == [("a", 1)]
+    assert parser.done
+
+
+def test_invalid_member_dropped_rest_kept():
+    parser = ObjectStreamParser()
+    members = parser.feed('{"a": tru, "b": "fine", "c": [1, 2,]}')
+    assert members == [("b", "fine")]
+    assert [error.split(":")[0] for error in parser.errors] == ["a", "c"]
+    assert parser.done
+
+
+def test_escaped_key_and_split_escape():
+    parser = ObjectStreamParser()
+    assert _feed_all(parser, ['{"a\\', '"b": "c\\', '\\d"}']) == [('a"b', "c\\d")]
@@ -0,0 +1,64 @@
+import logging
+import time
+
+from app import logging_setup
+from app.logging_setup import SizeAndTimeRotatingFileHandler
+
+
+def _handler(tmp_path, **kwargs):
+    options = dict(max_bytes=0, backup_count=3, interval=3600, compress=True)
+    options.update(kwargs)
+    handler = SizeAndTimeRotatingFileHandler(str(tmp_path / "model.log"), **options)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    return handler
+
+
+def _record(message: str) -> logging.LogRecord:
+    return logging.LogRecord(logging_setup.MODEL_OUTPUT_LOGGER, logging.INFO, __file__, 0, message, None, None)
+
+
+def test_interval_passing_before_first_write_does_not_break_logging(tmp_path):
+    handler = _handler(tmp_path)
+    handler.rollover_at = time.time() - 1
+    handler.emit(_record("first output"))
+    handler.close()
+    assert (tmp_path / "model.log").read_text() == "first output\n"
+    assert handler.rollover_at > time.time()
+    assert not list(tmp_path.glob("*.gz"))
+
+
+def test_failed_rotation_keeps_logging(tmp_path, monkeypatch):
+    handler = _handler(tmp_path)
+    handler.emit(_record("before"))
+
+    def broken(source, dest):
+        raise OSError("disk full")
+
+    handler.rotator = broken
+    monkeypatch.setattr(handler, "handleError", lambda record: None)
+    handler.rollover_at = time.time() - 1
+    handler.emit(_record("lost while rotating"))
+    handler.emit(_record("after"))
+    handler.close()
+    assert handler.rollover_at > time.time()
+    assert "after" in (tmp_path / "model.log").read_text()
+
+
+def test_model_output_stays_off_the_console_without_a_model_log(monkeypatch, capsys):
+    monkeypatch.setattr(logging_setup.settings, "model_log_path", "")
+    monkeypatch.setattr(logging_setup.settings, "log_format", "json")
+    root = logging.getLogger()
+    root_handlers, root_level = list(root.handlers), root.level
+    model_output = logging.getLogger(logging_setup.MODEL_OUTPUT_LOGGER)
+    try:
+        logging_setup.configure()
+        model_output.info("full model output")
+        logging.getLogger("app.test").warning("ordinary warning")
+    finally:
+        logging_setup.shutdown()
+        model_output.disabled = False
+        root.handlers[:] = root_handlers
+        root.setLevel(root_level)
+    err = capsys.readouterr().err
+    assert "ordinary warning" in err
+    assert "full model output" not in err
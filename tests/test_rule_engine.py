@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from app.services import rule_engine
+from app.services.rule_engine import AhoCorasick, RuleEngine, normalize_label_text
+
+RULES = {
+    "additives": {
+        "E211": {"name": "Sodium Benzoate", "aliases": ["sodium benzoate"], "risk": "Preservative"},
+        "E471": {"name": "Mono- and Diglycerides", "aliases": []},
+    },
+    "hidden_sugars": {
+        "High Fructose Corn Syrup": ["high fructose corn syrup"],
+        "Corn Syrup": ["corn syrup"],
+        "Fructose": ["fructose"],
+        "Dextrose": ["dextrose"],
+    },
+    "refined_flour": ["maida", "refined wheat flour"],
+    "claims": {"whole_grain": ["whole wheat", "atta"], "no_sugar": ["no added sugar"]},
+}
+
+
+def test_aho_corasick_reports_overlapping_matches():
+    automaton = AhoCorasick()
+    for word in ("he", "she", "his", "hers"):
+        automaton.add(word, word)
+    automaton.build()
+    assert sorted((start, end, word) for start, end, word in automaton.find("ushers")) == [
+        (1, 4, "she"), (2, 4, "he"), (2, 6, "hers"),
+    ]
+
+
+def test_normalizes_e_numbers_and_ins_codes():
+    assert normalize_label_text("INS 211, E-471, emulsifier (322(i), 471)") == "e211, e471, emulsifier (e322, e471)"
+
+
+def test_whole_words_longest_match_only():
+    engine = RuleEngine(RULES)
+    result = engine.detect("Sugar, High Fructose Corn Syrup, Dextrosefree flavour, Maida")
+    # "corn syrup" and "fructose" are inside the longer match; "dextrose" is not a whole word here
+    assert result.hidden_sugars == ["High Fructose Corn Syrup"]
+    assert result.alerts["maida_trap"].explanation == "Refined flour found: maida"
+
+
+def test_additives_found_by_code_or_alias():
+    engine = RuleEngine(RULES)
+    result = engine.detect("Water, Preservative (INS 211), Emulsifier (471), sodium benzoate")
+    assert result.harmful_additives == ["Sodium Benzoate (E211)", "Mono- and Diglycerides (E471)"]
+
+
+def test_marketing_traps_need_claim_and_contradiction():
+    engine = RuleEngine(RULES)
+    trap = engine.detect("Refined Wheat Flour, Dextrose", "Whole Wheat Cookies - No Added Sugar")
+    assert trap.alerts["maida_trap"].detected
+    assert len(trap.marketing_traps) == 2
+    honest = engine.detect("Whole Wheat Flour, Salt", "Whole Wheat Cookies")
+    assert not honest.marketing_traps and honest.overall_verdict == "Generally Safe"
+
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(RULES))
+    monkeypatch.setattr(rule_engine.settings, "rules_path", str(path))
+    monkeypatch.setattr(rule_engine, "RELOAD_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(rule_engine, "_engine", None)
+    return path
+
+
+def _rewrite(path, content: str) -> None:
+    mtime = os.path.getmtime(path)
+    path.write_text(content)
+    # Make sure the change is visible even on filesystems with coarse mtimes
+    os.utime(path, (mtime + 1, mtime + 1))
+
+
+def test_edited_rules_file_picked_up(rules_file):
+    assert rule_engine.detect("e999").harmful_additives == []
+    rules = dict(RULES, additives={"E999": {"name": "Test Additive", "aliases": []}})
+    _rewrite(rules_file, json.dumps(rules))
+    assert rule_engine.detect("e999").harmful_additives == ["Test Additive (E999)"]
+
+
+def test_invalid_rules_file_keeps_previous_engine(rules_file):
+    engine = rule_engine.get_engine()
+    _rewrite(rules_file, "{not json")
+    assert rule_engine.reload() is engine
+    assert rule_engine.detect("maida").alerts["maida_trap"].explanation == "Refined flour found: maida"
+
+
+def test_first_load_of_invalid_rules_file_raises(rules_file):
+    rules_file.write_text("{not json")
+    with pytest.raises(ValueError):
+        rule_engine.reload()
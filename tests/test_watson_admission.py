@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import admission, resilience, watson_ai_service
+from app.services.cache import TieredCache
+
+
+@pytest.fixture
+def watsonx(monkeypatch):
+    """One generation slot, a fresh breaker and cache, and short timeouts."""
+    monkeypatch.setattr(watson_ai_service, "admission_control", admission.AdmissionController(
+        "watsonx_test", max_concurrency=1, rate=0, burst=1, max_queue=10,
+    ))
+    monkeypatch.setattr(watson_ai_service, "breaker", resilience.CircuitBreaker(
+        "watsonx_test", failure_threshold=1, recovery_timeout=60,
+    ))
+    monkeypatch.setattr(watson_ai_service, "analysis_cache", TieredCache("analysis_test", max_entries=10, ttl=60))
+    monkeypatch.setattr(watson_ai_service.settings, "watsonx_timeout", 0.3)
+    monkeypatch.setattr(watson_ai_service.settings, "watsonx_queue_wait", 1.0)
+    return watson_ai_service
+
+
+def _slow(release: threading.Event, text: str):
+    def analyze():
+        release.wait(5)
+        return text
+    return analyze
+
+
+def _analyze(service, key: str, analyze):
+    return service._run_with_fallback(key, analyze, "sugar", "", None)
+
+
+def test_time_in_queue_does_not_count_as_model_timeout(watsonx):
+    async def scenario():
+        release = threading.Event()
+        first = asyncio.ensure_future(_analyze(watsonx, "first", _slow(release, "first analysis")))
+        await asyncio.sleep(0.05)
+        # Each generation takes under watsonx_timeout (0.3s), but `second` also queues behind `first`
+        second = asyncio.ensure_future(_analyze(watsonx, "second", lambda: time.sleep(0.2) or "second analysis"))
+        await asyncio.sleep(0.2)
+        release.set()
+        return await first, await second
+
+    first, second = asyncio.run(scenario())
+    assert (first, second) == ("first analysis", "second analysis")
+    assert watsonx.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_shed_from_saturated_queue_leaves_breaker_closed(watsonx, monkeypatch):
+    monkeypatch.setattr(watsonx.settings, "watsonx_queue_wait", 0.1)
+
+    async def scenario():
+        release = threading.Event()
+        first = asyncio.ensure_future(_analyze(watsonx, "first", _slow(release, "first analysis")))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.ensure_future(_analyze(watsonx, f"queued-{i}", lambda: "never")) for i in range(3)]
+        results = await asyncio.gather(*queued)
+        release.set()
+        await first
+        return results
+
+    results = asyncio.run(scenario())
+    assert all(watsonx.is_degraded(text) for text in results)
+    assert watsonx.breaker.stats()["state"] == "closed"
+    assert watsonx.admission_control.stats()["shed"] == 3
+
+
+def test_slow_generation_opens_breaker(watsonx):
+    async def scenario():
+        release = threading.Event()
+        try:
+            return await _analyze(watsonx, "slow", _slow(release, "too late"))
+        finally:
+            release.set()
+
+    assert watsonx.is_degraded(asyncio.run(scenario()))
+    assert watsonx.breaker.stats()["state"] == "open"
@@ -0,0 +1,43 @@
+import threading
+
+from app.services.watsonx_pool import ModelPool
+
+
+def _pool(size: int = 4) -> ModelPool:
+    return ModelPool(object, size=size, max_age=0)
+
+
+def test_warmup_fills_every_slot():
+    pool = _pool()
+    pool.warmup()
+    assert pool.stats() == {"size": 4, "created": 4, "idle": 4}
+
+
+def test_warmup_keeps_existing_idle_clients():
+    pool = _pool()
+    with pool.acquire():
+        pass
+    pool.warmup()
+    assert pool.stats() == {"size": 4, "created": 4, "idle": 4}
+
+
+def test_every_slot_usable_after_warmup():
+    pool = _pool()
+    pool.warmup()
+    inside = threading.Barrier(4, timeout=5)
+    errors = []
+
+    def borrow():
+        try:
+            with pool.acquire():
+                inside.wait()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=borrow) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    assert not errors
+    assert pool.stats()["idle"] == 4